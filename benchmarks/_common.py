@@ -0,0 +1,94 @@
+"""
+Shared fixtures for the benchmark scripts.
+
+The model pickles are stored with Git LFS; when they have not been pulled
+the benchmarks fall back to a synthetic forest with the same feature layout
+so the numbers still reflect the serving code paths.
+"""
+
+import logging
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ML_DIR = os.path.join(ROOT, 'moneyplan_ai')
+for path in (ROOT, ML_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+LOAN_FEATURES = [
+    'Gender', 'Married', 'Dependents', 'Education', 'Self_Employed',
+    'ApplicantIncome', 'CoapplicantIncome', 'LoanAmount',
+    'Loan_Amount_Term', 'Credit_History', 'Property_Area'
+]
+
+
+def quiet_server_logs():
+    """The servers log every request at INFO; keep benchmark output readable."""
+    logging.disable(logging.INFO)
+
+
+def load_pickle(path):
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        return None
+
+
+def synthetic_applications(n, seed=0):
+    """Random /predict request bodies."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for _ in range(n):
+        rows.append({
+            'Gender': str(rng.choice(['Male', 'Female'])),
+            'Married': str(rng.choice(['Yes', 'No'])),
+            'Dependents': str(rng.choice(['0', '1', '2', '3+'])),
+            'Education': str(rng.choice(['Graduate', 'Not Graduate'])),
+            'Self_Employed': str(rng.choice(['Yes', 'No'])),
+            'ApplicantIncome': float(rng.integers(1500, 80000)),
+            'CoapplicantIncome': float(rng.integers(0, 20000)),
+            'LoanAmount': float(rng.integers(20, 600)),
+            'Loan_Amount_Term': float(rng.choice([120, 180, 240, 360])),
+            'Credit_History': float(rng.choice([0, 1], p=[0.15, 0.85])),
+            'Property_Area': str(rng.choice(['Urban', 'Semiurban', 'Rural'])),
+        })
+    return rows
+
+
+def loan_model(n_estimators=100, seed=0):
+    """The real loan forest if present, else a synthetic one on the same features."""
+    model = load_pickle(os.path.join(ML_DIR, 'random_forest_model.pkl'))
+    if model is not None:
+        return model, 'random_forest_model.pkl'
+
+    import pandas as pd
+    from sklearn.ensemble import RandomForestClassifier
+    import ml_api_server
+
+    frame = ml_api_server.preprocess_input(synthetic_applications(600, seed))
+    rng = np.random.default_rng(seed)
+    score = (frame['Credit_History'] * 2
+             + frame['ApplicantIncome'] / 20000
+             - frame['LoanAmount'] / 200
+             + rng.normal(0, 0.5, len(frame)))
+    labels = np.where(score > 1.0, 'Y', 'N')
+    model = RandomForestClassifier(n_estimators=n_estimators, random_state=seed)
+    model.fit(pd.DataFrame(frame, columns=LOAN_FEATURES), labels)
+    return model, 'synthetic'
+
+
+def timed(fn, repeat=5):
+    """Best-of-``repeat`` wall time in milliseconds and the last result."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000.0, result
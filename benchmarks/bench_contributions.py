@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Cost of per-prediction feature contributions against plain prediction.
+
+For the sklearn loan forest and its compact export, times predict_proba and
+tree_contributions.predict_with_contributions over several batch sizes, and
+checks that the explained outputs match predict_proba and that
+bias + contributions reproduces them. Also times /predict end to end with
+and without ``?explain=true``.
+
+Usage: python benchmarks/bench_contributions.py [--batches 1,32,256,1000] [--trees 100]
+"""
+
+import argparse
+import os
+import tempfile
+
+import numpy as np
+
+import _common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--batches', default='1,32,256,1000')
+    parser.add_argument('--trees', type=int, default=100, help='trees in the synthetic forest')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=200, help='single-row /predict calls per mode')
+    args = parser.parse_args()
+
+    _common.quiet_server_logs()
+    import ml_api_server
+    import tree_contributions
+    from compact_forest import load_compact_forest, save_compact_forest
+
+    model, source = _common.loan_model(n_estimators=args.trees)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'loan.compact.npz')
+        save_compact_forest(model, path)
+        compact = load_compact_forest(path)
+    for estimator in (model, compact):
+        tree_contributions.prepare(estimator)  # built once per model; not part of the per-call cost
+
+    print(f"loan model: {source}")
+    print(f"{'model':>8} {'rows':>6} {'predict ms':>11} {'explain ms':>11} {'overhead':>9} "
+          f"{'max |out - proba|':>18} {'max residual':>13}")
+    applications = _common.synthetic_applications(max(int(b) for b in args.batches.split(',')), seed=1)
+    for batch in [int(b) for b in args.batches.split(',')]:
+        X = ml_api_server.preprocess_input(applications[:batch])
+        for name, estimator in (('sklearn', model), ('compact', compact)):
+            predict_ms, proba = _common.timed(lambda: estimator.predict_proba(X), args.repeat)
+            explain_ms, (outputs, bias, contributions) = _common.timed(
+                lambda: tree_contributions.predict_with_contributions(estimator, X), args.repeat)
+            mismatch = float(np.abs(outputs - proba).max())
+            residual = float(np.abs(bias + contributions.sum(axis=1) - outputs).max())
+            print(f"{name:>8} {batch:>6} {predict_ms:>11.2f} {explain_ms:>11.2f} "
+                  f"{explain_ms / predict_ms:>8.2f}x {mismatch:>18.2e} {residual:>13.2e}")
+
+    # End to end through the Flask app (the explain path bypasses micro-batching)
+    ml_api_server.model = model
+    client = ml_api_server.app.test_client()
+    bodies = applications[:args.requests]
+    print()
+    for label, url in (('/predict', '/predict'), ('/predict?explain=true', '/predict?explain=true')):
+        def run():
+            for body in bodies:
+                res = client.post(url, json=body)
+                if res.status_code != 200:
+                    raise RuntimeError(f"{url} returned {res.status_code}: {res.get_json()}")
+        ms, _ = _common.timed(run, 1)
+        print(f"{label:<24} {ms / len(bodies):>8.2f} ms/request")
+
+
+if __name__ == '__main__':
+    main()
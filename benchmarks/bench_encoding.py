@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Serialization and transfer cost of JSON vs MessagePack vs Arrow IPC.
+
+Drives the Flask app in-process for two large responses:
+- batch /predict (``--rows`` applications)
+- /emi/scenarios projection grid with full 30-year schedules
+
+For every Accept / Accept-Encoding combination it reports the body size,
+server time per request, client decode time and the estimated transfer time
+at ``--mbps``.
+
+Usage: python benchmarks/bench_encoding.py [--rows 1000] [--mbps 20]
+"""
+
+import argparse
+import gzip
+
+import _common
+
+import response_encoding as enc
+
+FORMATS = [enc.JSON] + [m for m in (enc.MSGPACK, enc.ARROW) if m in enc.available_formats()]
+
+
+def run_case(client, name, method, path, body, repeat, mbps):
+    print(f"\n{name}")
+    print(f"{'format':<40} {'gzip':>4} {'bytes':>10} {'server ms':>10} {'decode ms':>10} {'xfer ms':>9}")
+    baseline = None
+    for media_type in FORMATS:
+        for use_gzip in (False, True):
+            headers = {'Accept': media_type}
+            if use_gzip:
+                headers['Accept-Encoding'] = 'gzip'
+
+            server_ms, res = _common.timed(
+                lambda: client.open(path, method=method, json=body, headers=headers), repeat)
+            payload = res.data
+
+            def decode():
+                raw = gzip.decompress(payload) if res.headers.get('Content-Encoding') == 'gzip' else payload
+                return enc.decode(raw, res.mimetype)
+
+            decode_ms, _ = _common.timed(decode, repeat)
+            xfer_ms = len(payload) * 8 / (mbps * 1e6) * 1000.0
+            if baseline is None:
+                baseline = len(payload)
+            print(f"{res.mimetype:<40} {'yes' if use_gzip else 'no':>4} {len(payload):>10} "
+                  f"{server_ms:>10.2f} {decode_ms:>10.2f} {xfer_ms:>9.1f}"
+                  f"   ({len(payload) / baseline:.0%} of JSON)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1000, help='rows in the batch /predict request')
+    parser.add_argument('--mbps', type=float, default=20.0, help='link speed for transfer estimate')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    _common.quiet_server_logs()
+    import ml_api_server
+    ml_api_server.model, source = _common.loan_model()
+    client = ml_api_server.app.test_client()
+    print(f"loan model: {source}; formats: {', '.join(FORMATS)}")
+
+    run_case(client, f"batch /predict ({args.rows} rows)", 'POST', '/predict',
+             _common.synthetic_applications(args.rows), args.repeat, args.mbps)
+
+    grid = {
+        'principal': 5000000,
+        'annual_rates': [7.5, 8.0, 8.5, 9.0, 9.5, 10.0],
+        'tenures': [240, 300, 360],
+        'prepayments': [0, 2000, 5000],
+        'include_schedules': True,
+    }
+    run_case(client, '/emi/scenarios grid (54 x 30-year schedules)', 'POST', '/emi/scenarios',
+             grid, args.repeat, args.mbps)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Throughput and latency of single-row /predict with and without micro-batching.
+
+Sweeps client concurrency levels against batching windows (``off`` means the
+per-request predict/predict_proba path) and reports requests/s and latency
+percentiles for each combination.
+
+Usage: python benchmarks/bench_micro_batch.py [--requests 400]
+       [--concurrency 1,4,16,32] [--windows off,1,2,5] [--max-rows 32]
+"""
+
+import argparse
+import threading
+import time
+
+import numpy as np
+
+import _common
+
+
+def run(ml_api_server, rows, concurrency, total):
+    latencies = []
+    lock = threading.Lock()
+    per_thread = max(1, total // concurrency)
+
+    def client_loop(offset):
+        client = ml_api_server.app.test_client()
+        local = []
+        for i in range(per_thread):
+            body = rows[(offset + i) % len(rows)]
+            start = time.perf_counter()
+            res = client.post('/predict', json=body)
+            local.append(time.perf_counter() - start)
+            if res.status_code != 200:
+                raise RuntimeError(f"/predict returned {res.status_code}: {res.get_json()}")
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client_loop, args=(t * per_thread,)) for t in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    lat = np.array(latencies) * 1000.0
+    return len(lat) / elapsed, np.percentile(lat, 50), np.percentile(lat, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', default='1,4,16,32')
+    parser.add_argument('--windows', default='off,1,2,5', help="batch windows in ms; 'off' disables batching")
+    parser.add_argument('--max-rows', type=int, default=32)
+    parser.add_argument('--trees', type=int, default=100, help='trees in the synthetic forest')
+    args = parser.parse_args()
+
+    _common.quiet_server_logs()
+    import ml_api_server
+    from micro_batch import MicroBatcher
+
+    ml_api_server.model, source = _common.loan_model(n_estimators=args.trees)
+    rows = _common.synthetic_applications(256)
+    levels = [int(c) for c in args.concurrency.split(',')]
+    windows = args.windows.split(',')
+    print(f"loan model: {source}; {args.requests} requests per cell")
+    print(f"{'window':>8} {'clients':>8} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'avg batch':>10}")
+
+    admission = ml_api_server.loan_admission
+    admission.max_queue = args.requests
+    admission.queue_timeout = 60.0
+    for window in windows:
+        for concurrency in levels:
+            admission.max_concurrency = concurrency
+            if window == 'off':
+                ml_api_server.loan_batcher = None
+            else:
+                ml_api_server.loan_batcher = MicroBatcher(
+                    ml_api_server._loan_predict_proba, args.max_rows, float(window), name='bench')
+            throughput, p50, p99 = run(ml_api_server, rows, concurrency, args.requests)
+            batcher = ml_api_server.loan_batcher
+            avg_batch = batcher.metrics()['avg_batch_rows'] if batcher is not None else 1.0
+            print(f"{window:>8} {concurrency:>8} {throughput:>10.1f} {p50:>9.2f} {p99:>9.2f} {avg_batch:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Replay captured production traffic against one or two builds and compare them.
+
+A capture is the JSON-lines file written by moneyplan_ai/traffic_capture.py
+(``TRAFFIC_CAPTURE_PATH``). Requests are sent in their recorded order with
+their recorded inter-arrival gaps (scaled by ``--speed``; ``--speed 0`` sends
+as fast as ``--concurrency`` allows). Each build is replayed on its own so
+the two runs do not compete for CPU.
+
+Targets are either running servers (``--baseline-url`` / ``--candidate-url``)
+or repository checkouts (``--baseline-dir`` / ``--candidate-dir``), which are
+started through replay_server.py with stubbed rate providers so both builds
+see identical upstream data.
+
+The report gives per-endpoint latency percentiles for each build and, when
+two builds are replayed, every request whose status or normalized response
+body differs. Fields that legitimately change between runs (timestamps,
+report dates) are ignored; add more with ``--ignore-field``.
+
+Stateful endpoints (/portfolio/update, /retirement/strategy) are
+order-sensitive: use ``--concurrency 1`` when the capture contains them.
+
+Usage:
+    python benchmarks/replay.py capture.jsonl --app ml \\
+        --baseline-dir ../moneyplan-main --candidate-dir . --speed 0
+    python benchmarks/replay.py capture.jsonl --baseline-url http://localhost:5001
+"""
+
+import argparse
+import gzip
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import _common  # noqa: F401  (puts moneyplan_ai on sys.path)
+import response_encoding
+
+DEFAULT_IGNORED_FIELDS = ('timestamp', 'last_updated', 'report_date', 'lastUpdated', 'generated_at')
+FLOAT_DIGITS = 6
+HEALTH_PATHS = {'ml': '/health', 'portfolio': '/user/profile', 'unified': '/health'}
+
+
+def load_capture(path):
+    """Replayable entries from a capture file (plain or .gz), in arrival order."""
+    opener = gzip.open if path.endswith('.gz') else open
+    entries, skipped = [], 0
+    with opener(path, 'rt') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if 'raw_body_bytes' in entry or entry['path'].startswith('/admin/'):
+                skipped += 1
+                continue
+            entries.append(entry)
+    entries.sort(key=lambda e: e['t'])
+    return entries, skipped
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(source_dir, app):
+    """Launch replay_server.py for a checkout; returns (process, base_url)."""
+    port = _free_port()
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'replay_server.py')
+    proc = subprocess.Popen(
+        [sys.executable, script, '--source-dir', source_dir, '--app', app, '--port', str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server for {source_dir} exited with code {proc.returncode}")
+        try:
+            urllib.request.urlopen(url + HEALTH_PATHS[app], timeout=1).read()
+            return proc, url
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"Server for {source_dir} did not become ready on {url}")
+
+
+def send(base_url, entry, timeout):
+    """Issue one captured request; returns (status, content_type, body_bytes, latency_ms)."""
+    url = base_url.rstrip('/') + entry['path'] + (f"?{entry['query']}" if entry.get('query') else '')
+    headers = dict(entry.get('headers') or {})
+    data = None
+    if entry.get('body') is not None:
+        data = json.dumps(entry['body']).encode('utf-8')
+        headers['content-type'] = 'application/json'
+    request = urllib.request.Request(url, data=data, headers=headers, method=entry['method'])
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            status, response_headers, body = response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        status, response_headers, body = e.code, e.headers, e.read()
+    except (urllib.error.URLError, OSError) as e:
+        return None, None, str(e).encode('utf-8'), (time.perf_counter() - start) * 1000.0
+    latency_ms = (time.perf_counter() - start) * 1000.0
+    if (response_headers.get('Content-Encoding') or '').lower() == 'gzip':
+        body = gzip.decompress(body)
+    return status, response_headers.get('Content-Type'), body, latency_ms
+
+
+def replay(base_url, entries, speed=1.0, concurrency=8, timeout=30.0):
+    """Send every entry, preserving (scaled) inter-arrival gaps; results in entry order."""
+    results = [None] * len(entries)
+
+    def run(i):
+        results[i] = send(base_url, entries[i], timeout)
+
+    t0 = entries[0]['t'] if entries else 0.0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i, entry in enumerate(entries):
+            if speed:
+                delay = (entry['t'] - t0) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            if concurrency == 1:
+                # Strict ordering: each request waits for the previous one to finish
+                run(i)
+            else:
+                pool.submit(run, i)
+    return results, time.perf_counter() - started
+
+
+def normalize(content_type, body, ignored):
+    """Comparable form of a response body."""
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    try:
+        if media_type in (response_encoding.MSGPACK, response_encoding.ARROW):
+            value = response_encoding.decode(body, media_type)
+        elif media_type == response_encoding.JSON or media_type.endswith('+json'):
+            value = json.loads(body)
+        else:
+            return body
+    except Exception:
+        return body
+    return _strip(value, ignored)
+
+
+def _strip(value, ignored):
+    if isinstance(value, dict):
+        return {k: _strip(v, ignored) for k, v in value.items() if k not in ignored}
+    if isinstance(value, (list, tuple)):
+        return [_strip(v, ignored) for v in value]
+    if isinstance(value, float):
+        return round(value, FLOAT_DIGITS)
+    return value
+
+
+def _endpoint(entry):
+    return f"{entry['method']} {entry['path']}"
+
+
+def latency_table(entries, results):
+    by_endpoint = defaultdict(list)
+    for entry, (status, _, _, latency_ms) in zip(entries, results):
+        if status is not None:
+            by_endpoint[_endpoint(entry)].append(latency_ms)
+    table = {}
+    for endpoint, values in by_endpoint.items():
+        arr = np.asarray(values)
+        table[endpoint] = {
+            'count': int(arr.size),
+            'p50': float(np.percentile(arr, 50)),
+            'p90': float(np.percentile(arr, 90)),
+            'p99': float(np.percentile(arr, 99)),
+            'max': float(arr.max()),
+        }
+    return table
+
+
+def differences(entries, baseline, candidate, ignored):
+    """(index, endpoint, reason) for every request whose responses disagree."""
+    diffs = []
+    for i, (entry, a, b) in enumerate(zip(entries, baseline, candidate)):
+        if a[0] != b[0]:
+            diffs.append((i, _endpoint(entry), f"status {a[0]} != {b[0]}"))
+        elif normalize(a[1], a[2], ignored) != normalize(b[1], b[2], ignored):
+            diffs.append((i, _endpoint(entry), 'body differs'))
+    return diffs
+
+
+def print_report(entries, runs, diffs, show):
+    names = list(runs)
+    tables = {name: latency_table(entries, results) for name, (results, _) in runs.items()}
+    for name, (results, elapsed) in runs.items():
+        errors = sum(1 for r in results if r[0] is None)
+        print(f"{name}: {len(results)} requests in {elapsed:.2f}s, {errors} transport errors")
+
+    endpoints = sorted(set().union(*(t.keys() for t in tables.values())))
+    print()
+    header = f"{'endpoint':<36}{'n':>6}"
+    for name in names:
+        header += f"  {name[:9] + ' p50':>14}{'p90':>9}{'p99':>9}"
+    if len(names) == 2:
+        header += f"{'p50 delta':>11}"
+    print(header)
+    for endpoint in endpoints:
+        stats = [tables[name].get(endpoint) for name in names]
+        count = max(s['count'] for s in stats if s)
+        line = f"{endpoint[:35]:<36}{count:>6}"
+        for s in stats:
+            line += (f"  {s['p50']:>12.2f}ms{s['p90']:>7.2f}ms{s['p99']:>7.2f}ms" if s
+                     else f"  {'-':>14}{'-':>9}{'-':>9}")
+        if len(names) == 2 and all(stats):
+            base, cand = stats[0]['p50'], stats[1]['p50']
+            line += f"{(cand - base) / base * 100 if base else 0.0:>+10.1f}%"
+        print(line)
+
+    if len(names) == 2:
+        print()
+        print(f"{len(diffs)} of {len(entries)} responses differ")
+        for i, endpoint, reason in diffs[:show]:
+            print(f"  #{i} {endpoint}: {reason}")
+        if len(diffs) > show:
+            print(f"  ... {len(diffs) - show} more")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay captured traffic against one or two builds')
+    parser.add_argument('capture', help='JSON-lines capture (TRAFFIC_CAPTURE_PATH output)')
+    parser.add_argument('--app', choices=('ml', 'portfolio', 'unified'), default='ml',
+                        help='which server the *-dir options start')
+    parser.add_argument('--baseline-url')
+    parser.add_argument('--baseline-dir')
+    parser.add_argument('--candidate-url')
+    parser.add_argument('--candidate-dir')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='time scale for inter-arrival gaps (2 = twice as fast, 0 = no gaps)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--ignore-field', action='append', default=[],
+                        help='additional response field to ignore when comparing (repeatable)')
+    parser.add_argument('--show', type=int, default=20, help='differences to list')
+    parser.add_argument('--fail-on-diff', action='store_true', help='exit 1 when responses differ')
+    args = parser.parse_args()
+
+    if not (args.baseline_url or args.baseline_dir):
+        parser.error('a baseline is required (--baseline-url or --baseline-dir)')
+    entries, skipped = load_capture(args.capture)
+    print(f"{len(entries)} requests loaded from {args.capture}"
+          + (f" ({skipped} skipped: admin or non-JSON bodies)" if skipped else ''))
+    if not entries:
+        return 0
+
+    targets = [('baseline', args.baseline_url, args.baseline_dir),
+               ('candidate', args.candidate_url, args.candidate_dir)]
+    runs = {}
+    for name, url, source_dir in targets:
+        if not (url or source_dir):
+            continue
+        proc = None
+        if url is None:
+            proc, url = start_server(os.path.abspath(source_dir), args.app)
+        try:
+            runs[name] = replay(url, entries, args.speed, max(1, args.concurrency), args.timeout)
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait()
+
+    ignored = set(DEFAULT_IGNORED_FIELDS) | set(args.ignore_field)
+    diffs = (differences(entries, runs['baseline'][0], runs['candidate'][0], ignored)
+             if len(runs) == 2 else [])
+    print_report(entries, runs, diffs, args.show)
+    return 1 if diffs and args.fail_on_diff else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Serve one build of ml_api_server.py or portfolio_api_server.py for replay runs.
+
+Upstream rate providers are replaced by fixed quotes so two builds see
+identical data, the rate history goes to a throwaway file, and the loan
+model falls back to the seeded synthetic forest when the pickle is missing.
+
+Usage: python benchmarks/replay_server.py --source-dir DIR --app ml|portfolio|unified --port N
+"""
+
+import argparse
+import copy
+import logging
+import os
+import sys
+import tempfile
+
+import _common
+
+# URL fragment -> canned JSON returned instead of calling the provider
+STUB_QUOTES = {
+    'base=XAU': {'rates': {'INR': 222000.0}},
+    'base=XAG': {'rates': {'INR': 2650.0}},
+    'currencies/xau.json': {'xau': {'inr': 222000.0}},
+    'currencies/xag.json': {'xag': {'inr': 2650.0}},
+    'api.coingecko.com': {'bitcoin': {'inr': 5600000.0, 'inr_24h_change': 1.5}},
+    'api.coindesk.com': {'bpi': {'INR': {'rate_float': 5600000.0}}},
+}
+
+
+def stub_fetch_json(url, timeout=8):
+    for fragment, payload in STUB_QUOTES.items():
+        if fragment in url:
+            return copy.deepcopy(payload)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--source-dir', required=True, help='repository checkout of the build to serve')
+    parser.add_argument('--app', choices=('ml', 'portfolio', 'unified'), required=True)
+    parser.add_argument('--port', type=int, required=True)
+    args = parser.parse_args()
+
+    source = os.path.abspath(args.source_dir)
+    sys.path[:0] = [os.path.join(source, 'moneyplan_ai'), source]
+    for var in ('GOLDAPI_KEY', 'TRAFFIC_CAPTURE_PATH', 'PROFILE_SAMPLE_RATE'):
+        os.environ.pop(var, None)
+    os.environ['RATES_STORE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='replay-rates-'), 'rates.bin')
+    logging.disable(logging.INFO)
+
+    if args.app == 'ml':
+        os.chdir(os.path.join(source, 'moneyplan_ai'))
+        import ml_api_server
+        ml_api_server.fetch_json = stub_fetch_json
+        if not ml_api_server.load_model():
+            ml_api_server.model, _ = _common.loan_model()
+        ml_api_server.load_cibil_model()
+        ml_api_server.app.run(host='127.0.0.1', port=args.port, debug=False, threaded=True)
+    elif args.app == 'unified':
+        import uvicorn
+        import unified_api_server
+        import ml_api_server
+        ml_api_server.fetch_json = stub_fetch_json
+        load_model = ml_api_server.load_model
+
+        def load_model_or_synthetic():
+            if not load_model():
+                ml_api_server.model, _ = _common.loan_model()
+            return True
+
+        ml_api_server.load_model = load_model_or_synthetic
+        uvicorn.run(unified_api_server.app, host='127.0.0.1', port=args.port, log_level='warning')
+    else:
+        import uvicorn
+        import portfolio_api_server
+        uvicorn.run(portfolio_api_server.app, host='127.0.0.1', port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
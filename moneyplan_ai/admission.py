@@ -0,0 +1,142 @@
+"""
+Admission control for CPU-bound inference endpoints.
+
+Forest inference holds the GIL, so letting every request thread run at once
+only makes all of them slow together. Each AdmissionController lets a fixed
+number of requests run, parks a bounded number in a wait queue, and turns the
+rest away immediately:
+
+- queue full                      -> 429 Too Many Requests
+- waited longer than the deadline -> 503 Service Unavailable
+
+Both carry a Retry-After estimate derived from recent service times. Each model
+gets its own controller so a burst on one cannot starve the other.
+"""
+
+import functools
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from flask import jsonify
+
+# Recent wait times kept for percentile metrics
+_WAIT_SAMPLES = 512
+
+
+class Overloaded(Exception):
+    """Raised when a request is not admitted."""
+
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded concurrency plus a bounded, deadline-limited wait queue."""
+
+    def __init__(self, name, max_concurrency=2, max_queue=32, queue_timeout=2.0):
+        if max_concurrency < 1:
+            raise ValueError('max_concurrency must be at least 1')
+        self.name = name
+        self.max_concurrency = int(max_concurrency)
+        self.max_queue = int(max_queue)
+        self.queue_timeout = float(queue_timeout)
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._service_ewma = 0.05
+        self._waits = deque(maxlen=_WAIT_SAMPLES)
+        self._counters = {
+            'admitted': 0,
+            'completed': 0,
+            'rejected_queue_full': 0,
+            'rejected_deadline': 0,
+        }
+
+    def _retry_after(self):
+        # Time for everyone ahead of a new arrival to drain, in whole seconds
+        backlog = self._waiting + self._in_flight
+        return max(1, math.ceil(backlog * self._service_ewma / self.max_concurrency))
+
+    @contextmanager
+    def slot(self):
+        """Hold one execution slot for the duration of the block or raise Overloaded."""
+        arrived = time.monotonic()
+        with self._cond:
+            if self._in_flight >= self.max_concurrency:
+                if self._waiting >= self.max_queue:
+                    self._counters['rejected_queue_full'] += 1
+                    raise Overloaded(429, 'queue full', self._retry_after())
+                self._waiting += 1
+                deadline = arrived + self.queue_timeout
+                try:
+                    while self._in_flight >= self.max_concurrency:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._counters['rejected_deadline'] += 1
+                            raise Overloaded(503, 'queue deadline exceeded', self._retry_after())
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_flight += 1
+            self._counters['admitted'] += 1
+            self._waits.append(time.monotonic() - arrived)
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            with self._cond:
+                self._in_flight -= 1
+                self._counters['completed'] += 1
+                self._service_ewma = 0.8 * self._service_ewma + 0.2 * elapsed
+                self._cond.notify()
+
+    def metrics(self):
+        """Snapshot of queue depth, in-flight count, counters and wait times (ms)."""
+        with self._cond:
+            waits = sorted(self._waits)
+            snapshot = {
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue,
+                'queue_timeout_s': self.queue_timeout,
+                'in_flight': self._in_flight,
+                'queue_depth': self._waiting,
+                'service_time_ewma_ms': round(self._service_ewma * 1000.0, 3),
+                **self._counters,
+            }
+        if waits:
+            def pct(p):
+                return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000.0, 3)
+            snapshot['wait_ms'] = {'p50': pct(0.50), 'p95': pct(0.95), 'p99': pct(0.99),
+                                   'max': round(waits[-1] * 1000.0, 3)}
+        else:
+            snapshot['wait_ms'] = {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+        return snapshot
+
+
+def admission_controlled(controller):
+    """Flask view decorator: run the view inside one of ``controller``'s slots."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                with controller.slot():
+                    return view(*args, **kwargs)
+            except Overloaded as e:
+                response = jsonify({
+                    'error': 'Server busy',
+                    'message': f"{controller.name}: {e.reason}, retry later",
+                })
+                response.status_code = e.status
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response
+        return wrapper
+    return decorator
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Compact on-disk format for the loan and CIBIL random forests.
+
+A pickled sklearn forest stores, for every node, int64 child/feature indices,
+float64 thresholds and impurity / sample-count arrays that inference never
+reads. The exporter keeps only what prediction needs:
+
+- child indices as the smallest integer type that fits (int16 for most trees),
+  with leaves encoded as negative child indices (``~leaf_id``)
+- feature indices as int8/int16
+- thresholds as float32, rounded *down* so ``float32(x) <= threshold`` makes
+  exactly the same decision sklearn makes (it also casts inputs to float32)
+- one value row per leaf (class probabilities or the regression value),
+  optionally quantized to 8 or 16 bits
+- one float32 training weight per leaf, from which the internal node values
+  needed for per-prediction contributions (tree_contributions.py) are rebuilt,
+  as float32, on first use; ``--no-leaf-weights`` drops them
+
+Files are plain ``.npz`` archives (no pickle) loaded by ``load_compact_forest``,
+which returns an object with the predict / predict_proba surface the servers use.
+The exporter records the SHA-256 of the source pickle, so ``is_current_export``
+can tell when the pickle has changed since the export.
+
+Usage:
+    python compact_forest.py Cibil.pkl [-o Cibil.compact.npz] [--quantize 8] [--compress]
+                             [--no-leaf-weights]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+def _smallest_int(min_value, max_value):
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= min_value and max_value <= info.max:
+            return dtype
+    return np.int64
+
+
+def _float32_floor(values):
+    """Largest float32 not greater than each float64 value."""
+    narrowed = values.astype(np.float32)
+    above = narrowed.astype(np.float64) > values
+    narrowed[above] = np.nextafter(narrowed[above], np.float32(-np.inf))
+    return narrowed
+
+
+def _trees_of(estimator):
+    trees = getattr(estimator, 'estimators_', None)
+    if trees is None and hasattr(estimator, 'tree_'):
+        trees = [estimator]
+    if trees is None or not all(hasattr(t, 'tree_') for t in np.ravel(trees)):
+        raise ValueError(f"{type(estimator).__name__} is not a tree ensemble with averaged outputs")
+    if type(estimator).__name__.startswith(('GradientBoosting', 'HistGradientBoosting')):
+        raise ValueError('Boosted ensembles are not supported')
+    if getattr(estimator, 'n_outputs_', 1) != 1:
+        raise ValueError('Multi-output forests are not supported')
+    return list(trees)
+
+
+def export_forest(estimator, quantize_bits=None, leaf_weights=True):
+    """Flatten a fitted sklearn forest (or single tree) into compact arrays."""
+    if quantize_bits not in (None, 8, 16):
+        raise ValueError('quantize_bits must be None, 8 or 16')
+    trees = _trees_of(estimator)
+    is_classifier = hasattr(estimator, 'classes_')
+
+    lefts, rights, features, thresholds, leaf_values, weights = [], [], [], [], [], []
+    node_offsets, leaf_offsets = [], []
+    node_total = leaf_total = 0
+    max_depth = 0
+    for tree in trees:
+        t = tree.tree_
+        internal = t.children_left != -1
+        leaves = np.flatnonzero(~internal)
+        leaf_id = np.zeros(t.node_count, dtype=np.int64)
+        leaf_id[leaves] = np.arange(leaves.size)
+
+        lefts.append(np.where(internal, t.children_left, ~leaf_id))
+        rights.append(np.where(internal, t.children_right, 0))
+        features.append(np.where(internal, t.feature, 0))
+        thresholds.append(np.where(internal, _float32_floor(t.threshold), np.float32(0)).astype(np.float32))
+
+        value = t.value[leaves, 0, :]
+        if is_classifier:
+            totals = value.sum(axis=1, keepdims=True)
+            value = value / np.where(totals == 0, 1.0, totals)
+        leaf_values.append(value)
+        weights.append(t.weighted_n_node_samples[leaves])
+
+        node_offsets.append(node_total)
+        leaf_offsets.append(leaf_total)
+        node_total += t.node_count
+        leaf_total += leaves.size
+        max_depth = max(max_depth, int(t.max_depth))
+
+    left = np.concatenate(lefts)
+    right = np.concatenate(rights)
+    feature = np.concatenate(features)
+    values = np.concatenate(leaf_values).astype(np.float64)
+
+    arrays = {
+        'left': left.astype(_smallest_int(int(left.min()), int(left.max()))),
+        'right': right.astype(_smallest_int(0, int(right.max()))),
+        'feature': feature.astype(_smallest_int(0, int(feature.max()))),
+        'threshold': np.concatenate(thresholds),
+        'node_offsets': np.asarray(node_offsets, dtype=np.int64),
+        'leaf_offsets': np.asarray(leaf_offsets, dtype=np.int64),
+    }
+
+    value_offset, value_scale = 0.0, 1.0
+    if quantize_bits:
+        levels = 2 ** quantize_bits - 1
+        value_offset = float(values.min())
+        span = float(values.max()) - value_offset
+        value_scale = span / levels if span > 0 else 1.0
+        dtype = np.uint8 if quantize_bits == 8 else np.uint16
+        arrays['leaf_values'] = np.rint((values - value_offset) / value_scale).astype(dtype)
+    else:
+        arrays['leaf_values'] = values.astype(np.float32)
+
+    if leaf_weights:
+        arrays['leaf_weights'] = np.concatenate(weights).astype(np.float32)
+    if hasattr(estimator, 'feature_importances_'):
+        arrays['feature_importances'] = np.asarray(estimator.feature_importances_, dtype=np.float32)
+
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'source_type': type(estimator).__name__,
+        'kind': 'classifier' if is_classifier else 'regressor',
+        'n_features_in': int(getattr(estimator, 'n_features_in_', int(feature.max()) + 1)),
+        'max_depth': max_depth,
+        'value_offset': value_offset,
+        'value_scale': value_scale,
+        'quantize_bits': quantize_bits,
+    }
+    if is_classifier:
+        meta['classes'] = np.asarray(estimator.classes_).tolist()
+    if hasattr(estimator, 'feature_names_in_'):
+        meta['feature_names'] = [str(f) for f in estimator.feature_names_in_]
+    arrays['meta'] = np.array(json.dumps(meta))
+    return arrays
+
+
+def file_sha256(path):
+    """Hex SHA-256 of a file, read in 1 MB chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(2**20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_compact_forest(estimator, path, quantize_bits=None, compress=False, leaf_weights=True,
+                        source_path=None):
+    """Export ``estimator`` and write it to ``path`` (.npz).
+
+    ``source_path`` is the pickle ``estimator`` was loaded from; its digest is
+    stored for ``is_current_export``.
+    """
+    arrays = export_forest(estimator, quantize_bits, leaf_weights)
+    if source_path is not None:
+        meta = json.loads(str(arrays['meta']))
+        meta['source_sha256'] = file_sha256(source_path)
+        arrays['meta'] = np.array(json.dumps(meta))
+    with open(path, 'wb') as f:
+        (np.savez_compressed if compress else np.savez)(f, **arrays)
+    return path
+
+
+class CompactForest:
+    """Inference-only forest loaded from a compact .npz file."""
+
+    def __init__(self, arrays):
+        meta = json.loads(str(arrays['meta']))
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compact forest format: {meta.get('format_version')}")
+        self.meta = meta
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.node_offsets = arrays['node_offsets']
+        self.leaf_offsets = arrays['leaf_offsets']
+        self.leaf_values = (arrays['leaf_values'].astype(np.float32) * np.float32(meta['value_scale'])
+                            + np.float32(meta['value_offset']))
+        self.max_depth = int(meta['max_depth'])
+        self.n_features_in_ = int(meta['n_features_in'])
+        self.n_estimators = int(self.node_offsets.size)
+        if 'classes' in meta:
+            self.classes_ = np.asarray(meta['classes'])
+        if 'feature_names' in meta:
+            self.feature_names_in_ = np.asarray(meta['feature_names'], dtype=object)
+        if 'feature_importances' in arrays:
+            self.feature_importances_ = arrays['feature_importances'].astype(np.float64)
+        self.leaf_weights = arrays['leaf_weights'] if 'leaf_weights' in arrays else None
+        self._internal_values = None
+
+    def _as_matrix(self, X):
+        names = getattr(self, 'feature_names_in_', None)
+        if names is not None and hasattr(X, 'columns') and set(names).issubset(X.columns):
+            X = X[list(names)]
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected {self.n_features_in_} features, got shape {X.shape}")
+        return X
+
+    def apply(self, X):
+        """Global leaf row reached in every tree, shape (n_samples, n_estimators)."""
+        X = self._as_matrix(X)
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.zeros((X.shape[0], self.n_estimators), dtype=np.int64)
+        for _ in range(self.max_depth):
+            idx = node + self.node_offsets
+            left = self.left[idx]
+            internal = left >= 0
+            if not internal.any():
+                break
+            go_left = X[rows, self.feature[idx]] <= self.threshold[idx]
+            node = np.where(internal, np.where(go_left, left, self.right[idx]), node)
+        leaf = ~self.left[node + self.node_offsets].astype(np.int64)
+        return leaf + self.leaf_offsets
+
+    def internal_node_values(self):
+        """(row, values): output of every internal node, the training-weighted mean of its leaves.
+
+        ``values`` holds one float32 row per internal node (leaves keep theirs
+        in ``leaf_values``); ``row[node]`` is the row of global node id
+        ``node``. Computed tree by tree on first use and cached.
+        """
+        if self._internal_values is None:
+            if self.leaf_weights is None:
+                raise ValueError('Compact forest has no leaf weights; re-export it without --no-leaf-weights')
+            internal = self.left >= 0
+            row = np.cumsum(internal) - 1
+            values = np.empty((int(internal.sum()), self.leaf_values.shape[1]), dtype=self.leaf_values.dtype)
+            ends = np.r_[self.node_offsets[1:], self.left.size]
+            for start, end, leaf_offset in zip(self.node_offsets, ends, self.leaf_offsets):
+                left = self.left[start:end].astype(np.int64)
+                right = self.right[start:end].astype(np.int64)
+                is_leaf = left < 0
+                leaf_rows = ~left[is_leaf] + leaf_offset
+
+                weight = np.zeros(left.size)
+                total = np.zeros((left.size, values.shape[1]))
+                weight[is_leaf] = self.leaf_weights[leaf_rows]
+                total[is_leaf] = self.leaf_values[leaf_rows] * weight[is_leaf, None]
+                # Children always have larger ids than their parent, so summing
+                # levels from the deepest up visits every child before its parent
+                levels = []
+                level = np.zeros(1, dtype=np.int64)
+                while level.size:
+                    level = level[~is_leaf[level]]
+                    levels.append(level)
+                    level = np.r_[left[level], right[level]]
+                for parents in reversed(levels):
+                    weight[parents] = weight[left[parents]] + weight[right[parents]]
+                    total[parents] = total[left[parents]] + total[right[parents]]
+                values[row[start:end][~is_leaf]] = (total[~is_leaf] / np.where(
+                    weight[~is_leaf] > 0, weight[~is_leaf], 1.0)[:, None])
+            self._internal_values = (row, values)
+        return self._internal_values
+
+    def _mean_leaf_values(self, X):
+        return self.leaf_values[self.apply(X)].mean(axis=1, dtype=np.float64)
+
+    def predict_proba(self, X):
+        if self.meta['kind'] != 'classifier':
+            raise AttributeError('predict_proba is only available for classifiers')
+        return self._mean_leaf_values(X)
+
+    def predict(self, X):
+        values = self._mean_leaf_values(X)
+        if self.meta['kind'] == 'classifier':
+            return self.classes_.take(np.argmax(values, axis=1))
+        return values[:, 0]
+
+
+def load_compact_forest(path):
+    """Load a forest written by save_compact_forest."""
+    with np.load(path, allow_pickle=False) as data:
+        return CompactForest({key: data[key] for key in data.files})
+
+
+def compact_path_for(pickle_path):
+    """Conventional location of the compact file next to a pickle."""
+    return os.path.splitext(pickle_path)[0] + '.compact.npz'
+
+
+def is_current_export(compact, compact_path, pickle_path):
+    """False if the pickle has changed since ``compact`` was exported from it.
+
+    Uses the digest recorded at export time; older files without one are
+    compared by modification time instead.
+    """
+    digest = compact.meta.get('source_sha256')
+    if digest is not None:
+        return digest == file_sha256(pickle_path)
+    return os.path.getmtime(compact_path) >= os.path.getmtime(pickle_path)
+
+
+def _probe_inputs(compact, n_rows, seed=0):
+    """Random inputs spanning each feature's split thresholds."""
+    rng = np.random.default_rng(seed)
+    X = np.zeros((n_rows, compact.n_features_in_), dtype=np.float64)
+    internal = compact.left >= 0
+    for j in range(compact.n_features_in_):
+        splits = compact.threshold[internal & (compact.feature == j)]
+        if splits.size:
+            lo, hi = float(splits.min()), float(splits.max())
+            margin = max(1.0, 0.1 * (hi - lo))
+            X[:, j] = rng.uniform(lo - margin, hi + margin, n_rows)
+            # Also hit thresholds exactly, where rounding differences would show
+            exact = rng.random(n_rows) < 0.2
+            X[exact, j] = rng.choice(splits, exact.sum())
+    return X
+
+
+def compare(original, compact, X):
+    """Max absolute output difference and label agreement between two models.
+
+    Agreement is the fraction of rows given the same class label (None for
+    regressors); float32 values can flip the argmax of near-tied classes.
+    """
+    if compact.meta['kind'] == 'classifier':
+        diff = np.abs(original.predict_proba(X) - compact.predict_proba(X))
+        agreement = float(np.mean(original.predict(X) == compact.predict(X)))
+    else:
+        diff = np.abs(original.predict(X) - compact.predict(X))
+        agreement = None
+    return float(diff.max()), agreement
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a pickled forest to the compact format')
+    parser.add_argument('model', help='path to the sklearn pickle (e.g. Cibil.pkl)')
+    parser.add_argument('-o', '--output', help='output .npz (default: <model>.compact.npz)')
+    parser.add_argument('--quantize', type=int, choices=(8, 16), help='quantize leaf values to 8 or 16 bits')
+    parser.add_argument('--compress', action='store_true', help='zip-compress the archive (smaller, slower to load)')
+    parser.add_argument('--no-leaf-weights', action='store_true',
+                        help='omit leaf weights (smaller, but no per-prediction contributions)')
+    parser.add_argument('--inputs', help='optional .npy of real inputs for the accuracy check')
+    parser.add_argument('--probe-rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    with open(args.model, 'rb') as f:
+        original = pickle.load(f)
+    output = args.output or compact_path_for(args.model)
+    save_compact_forest(original, output, args.quantize, args.compress, not args.no_leaf_weights,
+                        source_path=args.model)
+    compact = load_compact_forest(output)
+
+    X = np.load(args.inputs) if args.inputs else _probe_inputs(compact, args.probe_rows)
+    max_diff, agreement = compare(original, compact, X)
+
+    before, after = os.path.getsize(args.model), os.path.getsize(output)
+    print(f"{args.model}: {before / 1e6:.2f} MB -> {output}: {after / 1e6:.2f} MB "
+          f"({after / before:.1%} of original, {before / max(after, 1):.1f}x smaller)")
+    print(f"dtypes: left={compact.left.dtype} right={compact.right.dtype} "
+          f"feature={compact.feature.dtype} threshold={compact.threshold.dtype} "
+          f"leaf_values={'uint%d' % args.quantize if args.quantize else 'float32'}")
+    print(f"max |prediction difference| over {len(X)} rows: {max_diff:.3g}")
+    if agreement is not None:
+        differing = round((1.0 - agreement) * len(X))
+        print(f"label agreement: {agreement:.4%} ({differing} of {len(X)} rows get a different class)")
+        if differing:
+            print("warning: some predicted labels differ from the pickle's (near-tied class "
+                  "probabilities flip under float32); check them with --inputs before deploying")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+EMI and amortization engine for the ML API server.
+
+All computations are closed-form and vectorized with NumPy: the outstanding
+balance after k payments is
+
+    B_k = P * (1 + r)^k - A * ((1 + r)^k - 1) / r
+
+where P is the principal, r the monthly rate and A the amount paid each month
+(EMI plus any fixed monthly prepayment). A whole grid of scenarios is therefore
+evaluated as a (scenarios x months) array instead of a month-by-month loop.
+"""
+
+import numpy as np
+
+# Largest tenure accepted by the API (40 years)
+MAX_MONTHS = 480
+# Upper bound on rate x tenure x prepayment combinations per request
+MAX_SCENARIOS = 2000
+# Fraction of net monthly income lenders typically allow for EMIs (FOIR)
+DEFAULT_FOIR_RANGE = (0.35, 0.50)
+DEFAULT_ANNUAL_RATE = 9.0
+
+
+def _as_1d(value, dtype=float):
+    return np.atleast_1d(np.asarray(value, dtype=dtype))
+
+
+def compute_emi(principal, annual_rate, months):
+    """Monthly instalment for each (principal, annual_rate %, months) triple."""
+    p = _as_1d(principal)
+    r = _as_1d(annual_rate) / 12.0 / 100.0
+    n = _as_1d(months)
+    p, r, n = np.broadcast_arrays(p, r, n)
+
+    emi = np.empty(p.shape, dtype=float)
+    zero = r == 0
+    growth = np.power(1.0 + r[~zero], n[~zero])
+    emi[~zero] = p[~zero] * r[~zero] * growth / (growth - 1.0)
+    emi[zero] = p[zero] / n[zero]
+    return emi
+
+
+def principal_for_emi(emi, annual_rate, months):
+    """Inverse of compute_emi: the loan principal an EMI can service."""
+    e = _as_1d(emi)
+    r = _as_1d(annual_rate) / 12.0 / 100.0
+    n = _as_1d(months)
+    e, r, n = np.broadcast_arrays(e, r, n)
+
+    principal = np.empty(e.shape, dtype=float)
+    zero = r == 0
+    principal[~zero] = e[~zero] * (1.0 - np.power(1.0 + r[~zero], -n[~zero])) / r[~zero]
+    principal[zero] = e[zero] * n[zero]
+    return principal
+
+
+def amortize(principal, annual_rate, months, prepayment=0.0):
+    """Build amortization schedules for many scenarios at once.
+
+    All arguments broadcast to a common shape (S,). Returns a dict of arrays:
+    ``emi``, ``effective_months``, ``total_interest`` and ``total_payment`` of
+    shape (S,), plus ``interest``, ``principal`` and ``balance`` of shape
+    (S, N) where N is the longest tenure. Months after payoff are zero.
+    """
+    p = _as_1d(principal)
+    rate = _as_1d(annual_rate)
+    n = _as_1d(months, dtype=np.int64)
+    extra = _as_1d(prepayment)
+    p, rate, n, extra = np.broadcast_arrays(p, rate, n, extra)
+
+    if p.size == 0:
+        raise ValueError("At least one scenario is required")
+    if not (np.isfinite(p).all() and np.isfinite(rate).all() and np.isfinite(extra).all()):
+        raise ValueError("principal, rate and prepayment must be finite numbers")
+    if np.any(p <= 0) or np.any(rate < 0) or np.any(n <= 0) or np.any(extra < 0):
+        raise ValueError("principal and months must be positive; rate and prepayment non-negative")
+    if np.any(n > MAX_MONTHS):
+        raise ValueError(f"months must not exceed {MAX_MONTHS}")
+
+    r = rate / 12.0 / 100.0
+    emi = compute_emi(p, rate, n)
+    payment = emi + extra
+
+    k = np.arange(1, int(n.max()) + 1, dtype=float)
+    growth = np.power(1.0 + r[:, None], k[None, :])
+    safe_r = np.where(r == 0, 1.0, r)[:, None]
+    annuity = np.where(r[:, None] == 0, k[None, :], (growth - 1.0) / safe_r)
+    balance = p[:, None] * growth - payment[:, None] * annuity
+
+    # Treat floating-point residue at payoff as fully repaid
+    balance[balance <= 1e-6 * p[:, None]] = 0.0
+    balance[k[None, :] >= n[:, None]] = 0.0
+
+    opening = np.concatenate([p[:, None], balance[:, :-1]], axis=1)
+    active = opening > 0
+    interest = np.where(active, opening * r[:, None], 0.0)
+    principal_paid = np.where(active, np.minimum(payment[:, None] - interest, opening), 0.0)
+
+    total_interest = interest.sum(axis=1)
+    return {
+        'emi': emi,
+        'effective_months': active.sum(axis=1),
+        'total_interest': total_interest,
+        'total_payment': total_interest + principal_paid.sum(axis=1),
+        'interest': interest,
+        'principal': principal_paid,
+        'balance': balance,
+    }
+
+
+def schedule_columns(result, index=0, decimals=2):
+    """Columnar (list-per-field) schedule for one scenario, trimmed at payoff."""
+    m = int(result['effective_months'][index])
+    return {
+        'month': list(range(1, m + 1)),
+        'interest': np.round(result['interest'][index, :m], decimals).tolist(),
+        'principal': np.round(result['principal'][index, :m], decimals).tolist(),
+        'balance': np.round(result['balance'][index, :m], decimals).tolist(),
+    }
+
+
+def scenario_grid(principal, annual_rates, tenures, prepayments=(0.0,)):
+    """Cartesian product of rates x tenures x prepayments for one principal."""
+    rates = _as_1d(annual_rates)
+    months = _as_1d(tenures, dtype=np.int64)
+    extras = _as_1d(prepayments)
+    if rates.size * months.size * extras.size > MAX_SCENARIOS:
+        raise ValueError(f"Too many scenarios (limit {MAX_SCENARIOS})")
+    rr, nn, xx = np.meshgrid(rates, months, extras, indexing='ij')
+    rr, nn, xx = rr.ravel(), nn.ravel(), xx.ravel()
+    return rr, nn, xx, amortize(principal, rr, nn, xx)
+
+
+def affordable_emi_range(monthly_income, annual_rate=DEFAULT_ANNUAL_RATE, months=360,
+                         foir_range=DEFAULT_FOIR_RANGE, existing_emi=0.0):
+    """EMI band (and matching principal) each monthly income can support.
+
+    Arguments broadcast against each other; returns a dict of arrays.
+    """
+    income, rate, n, existing = np.broadcast_arrays(
+        _as_1d(monthly_income), _as_1d(annual_rate), _as_1d(months), _as_1d(existing_emi))
+    low, high = foir_range
+    min_emi = np.maximum(low * income - existing, 0.0)
+    max_emi = np.maximum(high * income - existing, 0.0)
+    return {
+        'min_emi': min_emi,
+        'max_emi': max_emi,
+        'min_principal': principal_for_emi(min_emi, rate, n),
+        'max_principal': principal_for_emi(max_emi, rate, n),
+    }
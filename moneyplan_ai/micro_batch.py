@@ -0,0 +1,147 @@
+"""
+Dynamic micro-batching for model inference.
+
+Every sklearn ``predict_proba`` call pays a fixed overhead (input validation,
+per-tree dispatch) regardless of how many rows it scores. Under load many
+single-row /predict requests arrive within milliseconds of each other, so a
+single worker thread collects them for up to ``max_wait_ms`` (or until
+``max_batch_rows`` rows are queued), scores them in one vectorized call and
+hands each caller back its own slice of the result.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Queue sentinel asking the worker to exit
+_STOP = object()
+
+
+class MicroBatcher:
+    """Coalesce concurrent inference calls into one call to ``fn``."""
+
+    def __init__(self, fn, max_batch_rows=32, max_wait_ms=2.0, name='model'):
+        self.fn = fn
+        self.max_batch_rows = max(1, int(max_batch_rows))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._stats = {'batches': 0, 'rows': 0, 'requests': 0, 'max_batch_rows_seen': 0, 'split_batches': 0}
+
+    def _ensure_worker(self):
+        # Started lazily so importing the server (or Flask's reloader) spawns no threads
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(
+                        target=self._run, name=f"micro-batch-{self.name}", daemon=True)
+                    self._worker.start()
+
+    def submit(self, X):
+        """Queue rows ``X`` (DataFrame or 2-D array); returns a Future of the result rows."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((X, future))
+        return future
+
+    def __call__(self, X, timeout=10.0):
+        return self.submit(X).result(timeout)
+
+    def close(self, timeout=5.0):
+        """Stop the worker once it has scored everything queued before this call.
+
+        A later ``submit`` starts a new worker.
+        """
+        with self._lock:
+            worker, self._worker = self._worker, None
+        if worker is not None:
+            self._queue.put(_STOP)
+            worker.join(timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return None, 0
+        items = [first]
+        rows = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while rows < self.max_batch_rows:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Score what was collected first; the next _collect sees the sentinel
+                self._queue.put(_STOP)
+                break
+            items.append(item)
+            rows += len(item[0])
+        return items, rows
+
+    def _run(self):
+        while True:
+            items, rows = self._collect()
+            if items is None:
+                return
+            inputs = [X for X, _ in items]
+            futures = [f for _, f in items]
+            try:
+                if all(isinstance(X, pd.DataFrame) for X in inputs):
+                    batch = pd.concat(inputs, ignore_index=True) if len(inputs) > 1 else inputs[0]
+                else:
+                    batch = np.vstack([np.asarray(X) for X in inputs])
+                result = self.fn(batch)
+            except Exception as e:
+                if len(items) == 1:
+                    logger.error(f"Micro-batch inference failed for {self.name}: {e}")
+                    futures[0].set_exception(e)
+                    continue
+                # One bad input must not fail its neighbours: score each request on its own
+                logger.warning(f"Micro-batch inference failed for {self.name} ({e}); retrying "
+                               f"{len(items)} requests individually")
+                self._run_individually(items)
+                with self._lock:
+                    self._stats['split_batches'] += 1
+                continue
+
+            start = 0
+            for X, future in items:
+                end = start + len(X)
+                future.set_result(result[start:end])
+                start = end
+
+            with self._lock:
+                self._stats['batches'] += 1
+                self._stats['rows'] += rows
+                self._stats['requests'] += len(items)
+                self._stats['max_batch_rows_seen'] = max(self._stats['max_batch_rows_seen'], rows)
+
+    def _run_individually(self, items):
+        for X, future in items:
+            try:
+                result = self.fn(X)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def metrics(self):
+        """Batch counts and average batch size since start-up."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['max_batch_rows'] = self.max_batch_rows
+        stats['max_wait_ms'] = self.max_wait * 1000.0
+        stats['queue_depth'] = self._queue.qsize()
+        stats['avg_batch_rows'] = round(stats['rows'] / stats['batches'], 3) if stats['batches'] else 0.0
+        return stats
@@ -10,11 +10,13 @@ Usage:
 3. Server will run on http://localhost:5000
 """
 
+import math
 import os
 import pickle
 import pandas as pd
 import numpy as np
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, request, jsonify, has_request_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import logging
 import json as pyjson
@@ -22,28 +24,119 @@ from urllib.request import urlopen, Request
 from urllib.error import URLError, HTTPError
 import socket
 
+import emi_engine
+import response_encoding
+from admission import AdmissionController, admission_controlled
+from micro_batch import MicroBatcher
+from compact_forest import compact_path_for, is_current_export, load_compact_forest
+from rate_store import RateStore, SYMBOLS, parse_duration
+import request_profiling
+import traffic_capture
+import tree_contributions
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for Flutter web app
+class NegotiatedJSONProvider(DefaultJSONProvider):
+    """jsonify() that answers in MessagePack or Arrow IPC when the client asks for it"""
+
+    def response(self, *args, **kwargs):
+        if has_request_context():
+            formats = response_encoding.negotiate(request.headers.get('Accept'))
+            if formats[0] != response_encoding.JSON:
+                payload = args[0] if len(args) == 1 else (args or kwargs)
+                encoded = response_encoding.encode(payload, formats)
+                if encoded is not None:
+                    body, media_type = encoded
+                    return self._app.response_class(body, mimetype=media_type)
+        return super().response(*args, **kwargs)
+
+# Routes are registered on this blueprint; create_app() builds the Flask app around it
+api = Blueprint('ml_api', __name__)
+
+def compress_response(response):
+    """Gzip large bodies for clients that accept it"""
+    response.vary.add('Accept')
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    compressed = response_encoding.maybe_gzip(response.get_data(),
+                                              request.headers.get('Accept-Encoding'))
+    if compressed is not None:
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+    return response
+
+# Upper bound on rows accepted by a single batch /predict request
+MAX_BATCH_ROWS = 1000
+
+def _admission_from_env(name, prefix, default_concurrency=2):
+    """Build an AdmissionController from <PREFIX>_CONCURRENCY / _QUEUE / _QUEUE_TIMEOUT"""
+    return AdmissionController(
+        name,
+        max_concurrency=int(os.environ.get(f'{prefix}_CONCURRENCY', str(default_concurrency))),
+        max_queue=int(os.environ.get(f'{prefix}_QUEUE', '32')),
+        queue_timeout=float(os.environ.get(f'{prefix}_QUEUE_TIMEOUT', '2.0')),
+    )
+
+# Micro-batching of concurrent /predict calls (ML_API_MICRO_BATCH=0 disables it)
+MICRO_BATCH_ENABLED = os.environ.get('ML_API_MICRO_BATCH', '1') != '0'
+MICRO_BATCH_MAX_ROWS = int(os.environ.get('ML_API_BATCH_MAX_ROWS', '32'))
+MICRO_BATCH_WINDOW_MS = float(os.environ.get('ML_API_BATCH_WINDOW_MS', '2.0'))
+
+# Separate queues so a burst on one model cannot starve the other. With
+# micro-batching, admitted /predict handlers mostly wait on the batch worker
+# rather than compete for the GIL, so enough of them may run to fill a batch.
+loan_admission = _admission_from_env(
+    'loan', 'ML_API_LOAN',
+    default_concurrency=MICRO_BATCH_MAX_ROWS if MICRO_BATCH_ENABLED else 2)
+cibil_admission = _admission_from_env('cibil', 'ML_API_CIBIL')
 
 # Global variable to store the loaded model
 model = None
 # Separate model for CIBIL score
 cibil_model = None
 
+def _loan_predict_proba(X):
+    return model.predict_proba(X)
+
+loan_batcher = (MicroBatcher(_loan_predict_proba, MICRO_BATCH_MAX_ROWS, MICRO_BATCH_WINDOW_MS, name='loan')
+                if MICRO_BATCH_ENABLED else None)
+
+# Memory budget for each model's ?explain=true path table, built in the
+# background on the first explained request (or at load with
+# ML_API_EXPLAIN_PREPARE=1); larger forests are explained by walking the trees
+EXPLAIN_TABLE_MAX_BYTES = int(float(os.environ.get('ML_API_EXPLAIN_TABLE_MB', '256')) * 2**20)
+EXPLAIN_PREPARE_ON_LOAD = os.environ.get('ML_API_EXPLAIN_PREPARE', '').lower() in ('1', 'true', 'yes')
+
+def _read_model(model_path):
+    """Load a model, preferring its compact export (see compact_forest.py) when present and current"""
+    compact_path = compact_path_for(model_path)
+    if os.path.exists(compact_path):
+        compact = load_compact_forest(compact_path)
+        if not os.path.exists(model_path) or is_current_export(compact, compact_path, model_path):
+            return compact, compact_path
+        logger.warning(f"Ignoring {compact_path}: {os.path.basename(model_path)} has changed since "
+                       f"it was exported; re-run compact_forest.py")
+    if os.path.exists(model_path):
+        with open(model_path, 'rb') as file:
+            return pickle.load(file), model_path
+    return None, model_path
+
 def load_model():
-    """Load the random forest model from pickle file"""
+    """Load the random forest model from its compact export or pickle file"""
     global model
-    model_path = 'random_forest_model.pkl'
+    # Resolved next to this file so the server can be started (or imported) from any directory
+    model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'random_forest_model.pkl')
     
     try:
-        if os.path.exists(model_path):
-            with open(model_path, 'rb') as file:
-                model = pickle.load(file)
-            logger.info(f"Model loaded successfully from {model_path}")
+        loaded, source = _read_model(model_path)
+        if loaded is not None:
+            model = loaded
+            logger.info(f"Model loaded successfully from {source}")
+            if EXPLAIN_PREPARE_ON_LOAD:
+                tree_contributions.prepare_in_background(model, EXPLAIN_TABLE_MAX_BYTES)
             return True
         else:
             logger.error(f"Model file not found: {model_path}")
@@ -53,17 +146,19 @@ def load_model():
         return False
 
 def load_cibil_model():
-    """Load the CIBIL score model from pickle file"""
+    """Load the CIBIL score model from its compact export or pickle file"""
     global cibil_model
     # Try to load from same directory as this server file
     server_dir = os.path.dirname(os.path.abspath(__file__))
     model_path = os.path.join(server_dir, 'Cibil.pkl')
 
     try:
-        if os.path.exists(model_path):
-            with open(model_path, 'rb') as f:
-                cibil_model = pickle.load(f)
-            logger.info(f"CIBIL model loaded successfully from {model_path}")
+        loaded, source = _read_model(model_path)
+        if loaded is not None:
+            cibil_model = loaded
+            logger.info(f"CIBIL model loaded successfully from {source}")
+            if EXPLAIN_PREPARE_ON_LOAD:
+                tree_contributions.prepare_in_background(cibil_model, EXPLAIN_TABLE_MAX_BYTES)
             return True
         else:
             logger.error(f"CIBIL model file not found: {model_path}")
@@ -73,10 +168,10 @@ def load_cibil_model():
         return False
 
 def preprocess_input(data):
-    """Preprocess input data to match model training format"""
+    """Preprocess input data (one row or a list of rows) to match model training format"""
     try:
         # Create DataFrame with expected columns
-        df = pd.DataFrame([data])
+        df = pd.DataFrame(data if isinstance(data, list) else [data])
         
         # Handle categorical variables encoding
         # Gender: Male=1, Female=0
@@ -141,7 +236,7 @@ def preprocess_input(data):
         logger.error(f"Error in preprocessing: {str(e)}")
         raise ValueError(f"Data preprocessing failed: {str(e)}")
 
-@app.route('/health', methods=['GET'])
+@api.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
@@ -150,7 +245,35 @@ def health_check():
         'message': 'ML API Server is running'
     })
 
-@app.route('/predict', methods=['POST'])
+def metrics_snapshot():
+    """Admission and batching stats per model (also served by unified_api_server.py)"""
+    return {
+        'admission': {
+            'loan': loan_admission.metrics(),
+            'cibil': cibil_admission.metrics(),
+        },
+        'micro_batch': {
+            'loan': loan_batcher.metrics() if loan_batcher is not None else None,
+        }
+    }
+
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    """Admission queue depth, wait times, rejection counts and batching stats per model"""
+    return jsonify(metrics_snapshot())
+
+def _explain_requested():
+    """True when the request asks for per-feature contributions (?explain=true)"""
+    return request.args.get('explain', '').lower() in ('1', 'true', 'yes')
+
+def _positive_class_index(estimator):
+    """Column of the approved class ('Y') in predict_proba output"""
+    if hasattr(estimator, 'classes_'):
+        return list(estimator.classes_).index('Y') if 'Y' in estimator.classes_ else 1
+    return 1
+
+@api.route('/predict', methods=['POST'])
+@admission_controlled(loan_admission)
 def predict_loan_eligibility():
     """Predict loan eligibility using the loaded model"""
     try:
@@ -169,35 +292,99 @@ def predict_loan_eligibility():
                 'message': 'Please provide input data in JSON format'
             }), 400
         
-        logger.info(f"Received prediction request: {data}")
+        # A JSON list is a batch request: one prediction per row
+        batch = isinstance(data, list)
+        rows = data if batch else [data]
+        if batch:
+            if len(rows) > MAX_BATCH_ROWS:
+                raise ValueError(f"Batch too large (limit {MAX_BATCH_ROWS} rows)")
+            if not all(isinstance(row, dict) for row in rows):
+                raise ValueError('Batch rows must be JSON objects')
+            logger.info(f"Received batch prediction request: {len(rows)} rows")
+        else:
+            logger.info(f"Received prediction request: {data}")
         
         # Preprocess the input data
-        processed_data = preprocess_input(data)
+        processed_data = preprocess_input(rows)
+        annual_rate, existing_emi = _affordability_inputs(rows)
         
-        # Make prediction
-        prediction = model.predict(processed_data)[0]
+        prediction_proba = None
+        explanations = None
+        if _explain_requested():
+            # Probabilities and contributions come from one traversal of the forest
+            try:
+                prediction_proba, bias, contributions = tree_contributions.predict_with_contributions(
+                    model, processed_data)
+            except ValueError as e:
+                return jsonify({'error': 'Explanations not available', 'message': str(e)}), 400
+            tree_contributions.prepare_in_background(model, EXPLAIN_TABLE_MAX_BYTES)
+            positive_class_idx = _positive_class_index(model)
+            predictions = model.classes_.take(np.argmax(prediction_proba, axis=1))
+            target = f"probability of {model.classes_[positive_class_idx]}"
+            explanations = [
+                {'target': target, **e} for e in tree_contributions.describe(
+                    bias, contributions, tree_contributions.feature_names(model, processed_data.columns),
+                    [positive_class_idx] * len(rows))
+            ]
+        elif (loan_batcher is not None and not request_profiling.profiling_active()
+              and hasattr(model, 'predict_proba') and hasattr(model, 'classes_')):
+            # Forest predict() is argmax over predict_proba, so one batched call yields both.
+            # Profiled requests skip the batcher: their inference must run on this thread.
+            prediction_proba = loan_batcher(processed_data)
+            predictions = model.classes_.take(np.argmax(prediction_proba, axis=1))
+        else:
+            # Make prediction
+            predictions = model.predict(processed_data)
         
         # Get prediction probability if available
         try:
-            prediction_proba = model.predict_proba(processed_data)[0]
+            if prediction_proba is None:
+                prediction_proba = model.predict_proba(processed_data)
             # Get probability of positive class (loan approved)
-            if hasattr(model, 'classes_'):
-                positive_class_idx = list(model.classes_).index('Y') if 'Y' in model.classes_ else 1
-            else:
-                positive_class_idx = 1
-            probability = float(prediction_proba[positive_class_idx])
+            positive_class_idx = _positive_class_index(model)
+            probabilities = prediction_proba[:, positive_class_idx].astype(float)
         except Exception as e:
             logger.warning(f"Could not get prediction probability: {str(e)}")
-            probability = 0.8 if prediction == 'Y' else 0.2
+            probabilities = np.where(predictions == 'Y', 0.8, 0.2)
         
-        result = {
-            'prediction': str(prediction),
-            'probability': probability,
-            'model_info': {
-                'type': str(type(model).__name__),
-                'features_used': processed_data.columns.tolist()
+        model_info = {
+            'type': str(type(model).__name__),
+            'features_used': processed_data.columns.tolist()
+        }
+        try:
+            affordability = _affordability_for(processed_data, annual_rate, existing_emi)
+        except Exception as e:
+            logger.warning(f"Could not compute affordable EMI range: {str(e)}")
+            affordability = None
+
+        results = []
+        for i in range(len(rows)):
+            item = {
+                'prediction': str(predictions[i]),
+                'probability': float(probabilities[i]),
             }
+            if affordability is not None:
+                item['affordability'] = affordability[i]
+            if explanations is not None:
+                item['explanation'] = explanations[i]
+            results.append(item)
+
+        if batch:
+            return jsonify({
+                'predictions': results,
+                'count': len(results),
+                'model_info': model_info
+            })
+
+        result = {
+            'prediction': results[0]['prediction'],
+            'probability': results[0]['probability'],
+            'model_info': model_info
         }
+        if 'affordability' in results[0]:
+            result['affordability'] = results[0]['affordability']
+        if 'explanation' in results[0]:
+            result['explanation'] = results[0]['explanation']
         
         logger.info(f"Prediction result: {result}")
         
@@ -217,7 +404,7 @@ def predict_loan_eligibility():
             'message': str(e)
         }), 500
 
-@app.route('/model-info', methods=['GET'])
+@api.route('/model-info', methods=['GET'])
 def get_model_info():
     """Get information about the loaded model"""
     if model is None:
@@ -248,7 +435,7 @@ def get_model_info():
             'message': str(e)
         }), 500
 
-@app.route('/feature-importance', methods=['GET'])
+@api.route('/feature-importance', methods=['GET'])
 def get_feature_importance():
     """Get feature importance from the model"""
     if model is None:
@@ -283,8 +470,144 @@ def get_feature_importance():
             'message': str(e)
         }), 500
 
+# --- EMI and amortization endpoints ---
+
+# LoanAmount in the training data is expressed in thousands of rupees
+LOAN_AMOUNT_UNIT = 1000.0
+
+def _number_field(data, name, default=None, minimum=0.0):
+    """Finite float ``data[name]`` (``default`` when absent); ValueError naming the field."""
+    if name not in data:
+        if default is None:
+            raise ValueError(f"Missing field: {name}")
+        return default
+    try:
+        value = float(data[name])
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number")
+    if not math.isfinite(value):
+        raise ValueError(f"{name} must be a finite number")
+    if minimum is not None and value < minimum:
+        raise ValueError(f"{name} must not be negative")
+    return value
+
+def _affordability_inputs(rows):
+    """Validated (annual_rate, existing_emi) arrays for the /predict rows."""
+    annual_rate, existing_emi = [], []
+    for i, row in enumerate(rows):
+        try:
+            annual_rate.append(_number_field(row, 'interest_rate', emi_engine.DEFAULT_ANNUAL_RATE))
+            existing_emi.append(_number_field(row, 'existing_emi', 0.0))
+        except ValueError as e:
+            raise ValueError(f"Row {i}: {e}" if len(rows) > 1 else str(e))
+    return np.array(annual_rate), np.array(existing_emi)
+
+def _affordability_for(frame, annual_rate, existing_emi):
+    """Affordable EMI band for each preprocessed /predict row."""
+    monthly_income = frame['ApplicantIncome'].to_numpy(float) + frame['CoapplicantIncome'].to_numpy(float)
+    months = frame['Loan_Amount_Term'].to_numpy(float)
+    months = np.where(months > 0, months, 360.0)
+
+    band = emi_engine.affordable_emi_range(monthly_income, annual_rate, months,
+                                           existing_emi=existing_emi)
+    requested = frame['LoanAmount'].to_numpy(float) * LOAN_AMOUNT_UNIT
+    requested_emi = emi_engine.compute_emi(requested, annual_rate, months)
+    within_range = requested_emi <= band['max_emi']
+
+    columns = {k: np.round(v, 2).tolist() for k, v in band.items()}
+    columns['annual_rate'] = annual_rate.tolist()
+    columns['months'] = months.astype(int).tolist()
+    columns['requested_principal'] = np.round(requested, 2).tolist()
+    columns['requested_emi'] = np.round(requested_emi, 2).tolist()
+    columns['within_range'] = within_range.tolist()
+    foir_range = list(emi_engine.DEFAULT_FOIR_RANGE)
+    return [dict(values, foir_range=foir_range)
+            for values in (dict(zip(columns, row)) for row in zip(*columns.values()))]
+
+def _read_emi_inputs(data):
+    """Pull principal/rate/months/prepayment out of a JSON body."""
+    principal = _number_field(data, 'principal')
+    annual_rate = _number_field(data, 'annual_rate')
+    prepayment = _number_field(data, 'prepayment', 0.0)
+    try:
+        months = int(data['months'])
+    except KeyError as e:
+        raise ValueError(f"Missing field: {e.args[0]}")
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError('months must be a whole number')
+    return principal, annual_rate, months, prepayment
+
+@api.route('/emi/schedule', methods=['POST'])
+def emi_schedule():
+    """Full amortization schedule for a single loan, returned column-wise"""
+    try:
+        data = request.get_json() or {}
+        principal, annual_rate, months, prepayment = _read_emi_inputs(data)
+        result = emi_engine.amortize(principal, annual_rate, months, prepayment)
+
+        return jsonify({
+            'emi': round(float(result['emi'][0]), 2),
+            'effective_months': int(result['effective_months'][0]),
+            'total_interest': round(float(result['total_interest'][0]), 2),
+            'total_payment': round(float(result['total_payment'][0]), 2),
+            'schedule': emi_engine.schedule_columns(result),
+        })
+    except ValueError as e:
+        return jsonify({'error': 'Invalid input data', 'message': str(e)}), 400
+    except Exception as e:
+        logger.error(f"EMI schedule error: {str(e)}")
+        return jsonify({'error': 'EMI calculation failed', 'message': str(e)}), 500
+
+@api.route('/emi/scenarios', methods=['POST'])
+def emi_scenarios():
+    """Compare every combination of rates, tenures and prepayments in one call"""
+    try:
+        data = request.get_json() or {}
+        principal = _number_field(data, 'principal')
+        try:
+            rates = [float(v) for v in data['annual_rates']]
+            tenures = [int(v) for v in data['tenures']]
+            prepayments = [float(v) for v in data.get('prepayments', [0.0])]
+        except KeyError as e:
+            raise ValueError(f"Missing field: {e.args[0]}")
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError('annual_rates, tenures and prepayments must be numeric lists')
+
+        rates, tenures, prepayments, result = emi_engine.scenario_grid(
+            principal, rates, tenures, prepayments)
+
+        response = {
+            'principal': principal,
+            'count': int(rates.size),
+            'scenarios': {
+                'annual_rate': rates.tolist(),
+                'months': tenures.tolist(),
+                'prepayment': prepayments.tolist(),
+                'emi': np.round(result['emi'], 2).tolist(),
+                'effective_months': result['effective_months'].tolist(),
+                'total_interest': np.round(result['total_interest'], 2).tolist(),
+                'total_payment': np.round(result['total_payment'], 2).tolist(),
+            }
+        }
+        if data.get('include_schedules'):
+            response['schedules'] = [emi_engine.schedule_columns(result, i)
+                                     for i in range(rates.size)]
+        return jsonify(response)
+    except ValueError as e:
+        return jsonify({'error': 'Invalid input data', 'message': str(e)}), 400
+    except Exception as e:
+        logger.error(f"EMI scenarios error: {str(e)}")
+        return jsonify({'error': 'EMI calculation failed', 'message': str(e)}), 500
+
 # --- CIBIL score endpoints ---
 
+# Names of the features derived by _derive_cibil_features (zero padding follows)
+CIBIL_FEATURE_NAMES = ['age', 'pan_valid', 'mobile_prefix', 'name_length']
+
+def _cibil_feature_names(n_features):
+    padding = [f'padding_{i}' for i in range(max(0, n_features - len(CIBIL_FEATURE_NAMES)))]
+    return tree_contributions.feature_names(cibil_model, (CIBIL_FEATURE_NAMES + padding)[:n_features])
+
 def _derive_cibil_features(payload):
     """Derive a simple feature vector from provided personal info.
     This is a placeholder mapping to feed the model.
@@ -337,7 +660,7 @@ def _derive_cibil_features(payload):
         logger.error(f"Error deriving CIBIL features: {e}")
         return np.array([[30, 1, 7, 10]], dtype=float)
 
-@app.route('/cibil/health', methods=['GET'])
+@api.route('/cibil/health', methods=['GET'])
 def cibil_health():
     return jsonify({
         'status': 'healthy',
@@ -345,7 +668,8 @@ def cibil_health():
         'message': 'CIBIL model endpoint is running'
     })
 
-@app.route('/cibil/predict', methods=['POST'])
+@api.route('/cibil/predict', methods=['POST'])
+@admission_controlled(cibil_admission)
 def cibil_predict():
     """Predict CIBIL credit score using local pickle model and return a report-like JSON."""
     try:
@@ -357,10 +681,27 @@ def cibil_predict():
 
         X = _derive_cibil_features(payload)
 
+        explanation = None
+        if _explain_requested():
+            # The prediction is taken from the same traversal as its contributions
+            try:
+                outputs, bias, contributions = tree_contributions.predict_with_contributions(cibil_model, X)
+            except ValueError as e:
+                return jsonify({'success': False, 'error': f'Explanations not available: {e}'}), 400
+            tree_contributions.prepare_in_background(cibil_model, EXPLAIN_TABLE_MAX_BYTES)
+            if hasattr(cibil_model, 'classes_'):
+                column = int(np.argmax(outputs[0]))
+                explained_y = cibil_model.classes_.take([column])
+                target = f"probability of class {cibil_model.classes_[column]}"
+            else:
+                column, explained_y, target = 0, outputs[:, 0], 'score'
+            explanation = {'target': target, **tree_contributions.describe(
+                bias, contributions, _cibil_feature_names(X.shape[1]), [column])[0]}
+
         # Try to predict score directly; otherwise map proba to 300-900
         score_value = 700
         try:
-            y = cibil_model.predict(X)
+            y = cibil_model.predict(X) if explanation is None else explained_y
             score_value = int(float(y[0])) if hasattr(y, '__iter__') else int(float(y))
         except Exception as e:
             logger.warning(f"CIBIL predict() failed, trying predict_proba: {e}")
@@ -407,6 +748,9 @@ def cibil_predict():
             }
         }
 
+        if explanation is not None:
+            report_json['data']['explanation'] = explanation
+
         return jsonify(report_json)
     except Exception as e:
         logger.error(f"CIBIL prediction error: {e}")
@@ -438,7 +782,43 @@ def per10g_from_per_oz(value: float) -> float:
     except Exception:
         return 0.0
 
-@app.route('/rates/gold', methods=['GET'])
+# Every tick fetched from an upstream source is kept for history queries
+rate_store = RateStore(os.environ.get(
+    'RATES_STORE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'rates.bin')))
+
+def _rate_response(symbol, price, source, change_pct=None):
+    """Record a fetched tick and return it, with day-over-day change from stored history
+    unless the source already reports one."""
+    if change_pct is not None:
+        change, change_pct = float(price) * float(change_pct) / 100.0, float(change_pct)
+    else:
+        change, change_pct = rate_store.change(symbol, price)
+    try:
+        rate_store.append(symbol, price, source)
+    except Exception as e:
+        logger.error(f"Could not record {symbol} rate: {e}")
+    return jsonify({'price': price, 'change': change, 'changePercent': change_pct, 'source': source})
+
+@api.route('/rates/history/<symbol>', methods=['GET'])
+def rates_history(symbol):
+    """OHLC history of recorded ticks, e.g. /rates/history/gold?range=7d&bucket=1h"""
+    if symbol not in SYMBOLS:
+        return jsonify({'error': 'Unknown symbol', 'message': f"Use one of {list(SYMBOLS)}"}), 404
+    try:
+        range_s = parse_duration(request.args.get('range', '7d'))
+        bucket_s = parse_duration(request.args.get('bucket', '1h'))
+        candles = rate_store.ohlc(symbol, range_s, bucket_s)
+    except ValueError as e:
+        return jsonify({'error': 'Invalid query', 'message': str(e)}), 400
+    return jsonify({
+        'symbol': symbol,
+        'range_seconds': range_s,
+        'bucket_seconds': bucket_s,
+        'candles': candles,
+    })
+
+@api.route('/rates/gold', methods=['GET'])
 def rates_gold():
     # Optional primary: goldapi.io (requires API key) for XAU/INR per ounce
     try:
@@ -455,7 +835,7 @@ def rates_gold():
                         price_10g = float(price_oz_inr) * 10.0
                     else:
                         price_10g = per10g_from_per_oz(float(price_oz_inr))
-                    return jsonify({'price': price_10g, 'change': 0.0, 'changePercent': 0.0, 'source': 'goldapi'})
+                    return _rate_response('gold', price_10g, 'goldapi')
     except Exception as e:
         logger.error(f"GoldAPI primary error: {e}")
     """Gold price in INR per 10g via server-side fetch to avoid CORS."""
@@ -467,14 +847,14 @@ def rates_gold():
         rate_inr = (data.get('rates') or {}).get('INR')
         if isinstance(rate_inr, (int, float)) and rate_inr > 0:
             price_10g = per10g_from_per_oz(rate_inr)
-            return jsonify({'price': price_10g, 'change': 0.0, 'changePercent': 0.0, 'source': 'exchangerate.host'})
+            return _rate_response('gold', price_10g, 'exchangerate.host')
 
     data = fetch_json(fallback)
     if data and isinstance(data, dict):
         rate_inr = (data.get('xau') or {}).get('inr')
         if isinstance(rate_inr, (int, float)) and rate_inr > 0:
             price_10g = per10g_from_per_oz(rate_inr)
-            return jsonify({'price': price_10g, 'change': 0.0, 'changePercent': 0.0, 'source': 'jsdelivr'})
+            return _rate_response('gold', price_10g, 'jsdelivr')
 
     # Secondary fallback: Yahoo Finance XAUUSD and USDINR
     try:
@@ -486,7 +866,7 @@ def rates_gold():
                 price = results[0].get('regularMarketPrice')
                 if isinstance(price, (int, float)) and price > 0:
                     price_10g = per10g_from_per_oz(float(price))
-                    return jsonify({'price': price_10g, 'change': 0.0, 'changePercent': 0.0, 'source': 'yahoo'})
+                    return _rate_response('gold', price_10g, 'yahoo')
 
         yf = fetch_json('https://query1.finance.yahoo.com/v7/finance/quote?symbols=XAUUSD=X,USDINR=X')
         if yf and isinstance(yf, dict):
@@ -502,13 +882,13 @@ def rates_gold():
             if xauusd and usdinr:
                 rate_inr = xauusd * usdinr
                 price_10g = per10g_from_per_oz(rate_inr)
-                return jsonify({'price': price_10g, 'change': 0.0, 'changePercent': 0.0, 'source': 'yahoo'})
+                return _rate_response('gold', price_10g, 'yahoo')
     except Exception as e:
         logger.error(f"Yahoo fallback (gold) error: {e}")
 
     return jsonify({'price': 71500.0, 'change': 350.0, 'changePercent': 0.49, 'source': 'fallback'}), 200
 
-@app.route('/rates/silver', methods=['GET'])
+@api.route('/rates/silver', methods=['GET'])
 def rates_silver():
     # Optional primary: goldapi.io (requires API key) for XAG/INR per ounce
     try:
@@ -524,7 +904,7 @@ def rates_silver():
                         price_10g = float(price_oz_inr) * 10.0
                     else:
                         price_10g = per10g_from_per_oz(float(price_oz_inr))
-                    return jsonify({'price': price_10g, 'change': 0.0, 'changePercent': 0.0, 'source': 'goldapi'})
+                    return _rate_response('silver', price_10g, 'goldapi')
     except Exception as e:
         logger.error(f"GoldAPI primary error (silver): {e}")
     """Silver price in INR per 10g via server-side fetch to avoid CORS."""
@@ -536,14 +916,14 @@ def rates_silver():
         rate_inr = (data.get('rates') or {}).get('INR')
         if isinstance(rate_inr, (int, float)) and rate_inr > 0:
             price_10g = per10g_from_per_oz(rate_inr)
-            return jsonify({'price': price_10g, 'change': 0.0, 'changePercent': 0.0, 'source': 'exchangerate.host'})
+            return _rate_response('silver', price_10g, 'exchangerate.host')
 
     data = fetch_json(fallback)
     if data and isinstance(data, dict):
         rate_inr = (data.get('xag') or {}).get('inr')
         if isinstance(rate_inr, (int, float)) and rate_inr > 0:
             price_10g = per10g_from_per_oz(rate_inr)
-            return jsonify({'price': price_10g, 'change': 0.0, 'changePercent': 0.0, 'source': 'jsdelivr'})
+            return _rate_response('silver', price_10g, 'jsdelivr')
 
     # Secondary fallback: Yahoo Finance XAGUSD and USDINR
     try:
@@ -555,7 +935,7 @@ def rates_silver():
                 price = results[0].get('regularMarketPrice')
                 if isinstance(price, (int, float)) and price > 0:
                     price_10g = per10g_from_per_oz(float(price))
-                    return jsonify({'price': price_10g, 'change': 0.0, 'changePercent': 0.0, 'source': 'yahoo'})
+                    return _rate_response('silver', price_10g, 'yahoo')
 
         yf = fetch_json('https://query1.finance.yahoo.com/v7/finance/quote?symbols=XAGUSD=X,USDINR=X')
         if yf and isinstance(yf, dict):
@@ -571,13 +951,13 @@ def rates_silver():
             if xagusd and usdinr:
                 rate_inr = xagusd * usdinr
                 price_10g = per10g_from_per_oz(rate_inr)
-                return jsonify({'price': price_10g, 'change': 0.0, 'changePercent': 0.0, 'source': 'yahoo'})
+                return _rate_response('silver', price_10g, 'yahoo')
     except Exception as e:
         logger.error(f"Yahoo fallback (silver) error: {e}")
 
     return jsonify({'price': 950.0, 'change': 5.0, 'changePercent': 0.53, 'source': 'fallback'}), 200
 
-@app.route('/rates/bitcoin', methods=['GET'])
+@api.route('/rates/bitcoin', methods=['GET'])
 def rates_bitcoin():
     """Bitcoin price in INR via server-side fetch to avoid CORS."""
     primary = 'https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=inr&include_24hr_change=true'
@@ -589,27 +969,65 @@ def rates_bitcoin():
         price_inr = btc.get('inr')
         change_pct = btc.get('inr_24h_change')
         if isinstance(price_inr, (int, float)) and price_inr > 0:
-            return jsonify({'price': float(price_inr), 'change': float(price_inr) * float(change_pct or 0.0) / 100.0, 'changePercent': float(change_pct or 0.0), 'source': 'coingecko'})
+            return _rate_response('bitcoin', float(price_inr), 'coingecko', change_pct=change_pct)
 
     data = fetch_json(fallback)
     if data and isinstance(data, dict):
         bpi_inr = ((data.get('bpi') or {}).get('INR') or {})
         price_inr = bpi_inr.get('rate_float')
         if isinstance(price_inr, (int, float)) and price_inr > 0:
-            return jsonify({'price': float(price_inr), 'change': 0.0, 'changePercent': 0.0, 'source': 'coindesk'})
+            return _rate_response('bitcoin', float(price_inr), 'coindesk')
 
     return jsonify({'price': 4125000.0, 'change': 51562.50, 'changePercent': 1.25, 'source': 'fallback'}), 200
 
+def create_app(standalone=True):
+    """Flask app serving the ML API.
+
+    With ``standalone=False`` (unified_api_server.py) CORS, gzip and the
+    optional profiling / capture hooks are left to the embedding server;
+    responses are still content-negotiated by the JSON provider.
+    """
+    app = Flask(__name__)
+    app.json = NegotiatedJSONProvider(app)
+    app.register_blueprint(api)
+    if not standalone:
+        return app
+
+    CORS(app)  # Enable CORS for Flutter web app
+    app.after_request(compress_response)
+
+    # Opt-in request profiling; installs no hooks unless configured
+    profiling_config = request_profiling.ProfilingConfig.from_env('ml_api')
+    if profiling_config.enabled:
+        request_profiling.install_flask(app, profiling_config)
+
+    # Opt-in traffic capture for benchmarks/replay.py (TRAFFIC_CAPTURE_PATH)
+    if traffic_capture.capture_path_from_env():
+        traffic_capture.install_flask(app, traffic_capture.capture_path_from_env())
+    return app
+
+_standalone_app = None
+
+def __getattr__(name):
+    # ``ml_api_server.app`` is the standalone app, built on first access so that
+    # importing this module (e.g. from unified_api_server.py) installs no hooks
+    global _standalone_app
+    if name == 'app':
+        if _standalone_app is None:
+            _standalone_app = create_app()
+        return _standalone_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 if __name__ == '__main__':
     # Load the model on startup
     base_ok = load_model()
     cibil_ok = load_cibil_model()
     if base_ok or cibil_ok:
         logger.info("Starting ML API Server...")
-        app.run(host='0.0.0.0', port=5000, debug=True, threaded=True)
+        create_app().run(host='0.0.0.0', port=5000, debug=True, threaded=True)
     else:
         logger.error("Failed to load models. Server not started.")
         print("\nTo fix this issue:")
-        print("1. Ensure 'random_forest_model.pkl' and 'Cibil.pkl' exist in the current directory")
+        print("1. Ensure 'random_forest_model.pkl' and 'Cibil.pkl' exist next to ml_api_server.py")
         print("2. Install required packages: pip install flask pandas scikit-learn numpy flask-cors")
         print("3. Check that the pickle files are not corrupted")
\ No newline at end of file
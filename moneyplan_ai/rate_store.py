@@ -0,0 +1,156 @@
+"""
+Append-only time-series store for fetched gold, silver and bitcoin rates.
+
+Every tick is one fixed-width record (timestamp, symbol, source, price)
+appended to a single binary file. The layout is row-wise, not columnar: a
+tick is one 24-byte write, and there is no per-field file to keep in step.
+Reads memory-map the file as a NumPy structured array, so a column such as
+``price`` is a zero-copy (strided) view and history queries (day-over-day
+change, OHLC downsampling) are vectorized scans instead of upstream API
+calls.
+
+Records are appended in arrival order and each timestamp is taken (and
+clamped to the previous one) under the append lock, so timestamps are
+non-decreasing and time ranges are located with ``searchsorted``.
+"""
+
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+SYMBOLS = ('gold', 'silver', 'bitcoin')
+SOURCES = ('other', 'goldapi', 'exchangerate.host', 'jsdelivr', 'yahoo', 'coingecko', 'coindesk')
+
+RECORD = np.dtype([
+    ('ts_ms', '<i8'),
+    ('price', '<f8'),
+    ('symbol', 'u1'),
+    ('source', 'u1'),
+    ('_pad', 'V6'),
+])
+
+# Upper bound on buckets returned by a single history query
+MAX_BUCKETS = 2000
+
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+
+
+def parse_duration(text):
+    """'15m' / '1h' / '7d' -> seconds."""
+    text = str(text).strip().lower()
+    if not text or text[-1] not in _UNITS:
+        raise ValueError(f"Invalid duration: {text!r} (use e.g. 15m, 1h, 7d)")
+    try:
+        value = float(text[:-1])
+    except ValueError:
+        raise ValueError(f"Invalid duration: {text!r} (use e.g. 15m, 1h, 7d)")
+    if not math.isfinite(value) or value <= 0:
+        raise ValueError(f"Duration must be positive and finite: {text!r}")
+    return value * _UNITS[text[-1]]
+
+
+class RateStore:
+    """Memory-mapped, append-only file of fixed-width rate ticks."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._view = None
+        self._view_len = 0
+        self._last_ts_ms = None
+
+    def append(self, symbol, price, source, ts=None):
+        """Record one tick; ``ts`` is epoch seconds (default: now).
+
+        A timestamp older than the last record is moved up to it, keeping the
+        file sorted.
+        """
+        record = np.zeros(1, dtype=RECORD)
+        record['price'] = float(price)
+        record['symbol'] = SYMBOLS.index(symbol)
+        record['source'] = SOURCES.index(source) if source in SOURCES else 0
+        with self._lock:
+            if self._last_ts_ms is None:
+                self._last_ts_ms = self._read_last_ts_ms()
+            ts_ms = max(int((time.time() if ts is None else ts) * 1000), self._last_ts_ms)
+            record['ts_ms'] = ts_ms
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'ab') as f:
+                f.write(record.tobytes())
+            self._last_ts_ms = ts_ms
+
+    def _read_last_ts_ms(self):
+        try:
+            with open(self.path, 'rb') as f:
+                count = os.fstat(f.fileno()).st_size // RECORD.itemsize
+                if not count:
+                    return np.iinfo(np.int64).min
+                f.seek((count - 1) * RECORD.itemsize)
+                return int(np.frombuffer(f.read(RECORD.itemsize), dtype=RECORD)['ts_ms'][0])
+        except OSError:
+            return np.iinfo(np.int64).min
+
+    def records(self):
+        """All complete records as a read-only structured array (memory-mapped)."""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return np.zeros(0, dtype=RECORD)
+        count = size // RECORD.itemsize
+        with self._lock:
+            if self._view is None or self._view_len != count:
+                self._view = (np.memmap(self.path, dtype=RECORD, mode='r', shape=(count,))
+                              if count else np.zeros(0, dtype=RECORD))
+                self._view_len = count
+            return self._view
+
+    def _series(self, symbol, start_s=None, end_s=None):
+        data = self.records()
+        ts = data['ts_ms']
+        lo = 0 if start_s is None else int(np.searchsorted(ts, int(start_s * 1000), side='left'))
+        hi = len(ts) if end_s is None else int(np.searchsorted(ts, int(end_s * 1000), side='right'))
+        window = data[lo:hi]
+        window = window[window['symbol'] == SYMBOLS.index(symbol)]
+        return window['ts_ms'], window['price']
+
+    def price_at(self, symbol, ts, lookback_s=7 * 86400):
+        """Last recorded price at or before ``ts`` (within ``lookback_s``), or None."""
+        _, prices = self._series(symbol, ts - lookback_s, ts)
+        return float(prices[-1]) if prices.size else None
+
+    def change(self, symbol, price, period_s=86400, now=None):
+        """(change, change_percent) of ``price`` against the price ``period_s`` ago."""
+        now = time.time() if now is None else now
+        previous = self.price_at(symbol, now - period_s)
+        if not previous:
+            return 0.0, 0.0
+        delta = float(price) - previous
+        return delta, delta / previous * 100.0
+
+    def ohlc(self, symbol, range_s, bucket_s, now=None):
+        """Downsample the last ``range_s`` seconds into OHLC buckets of ``bucket_s``."""
+        if range_s / bucket_s > MAX_BUCKETS:
+            raise ValueError(f"Too many buckets (limit {MAX_BUCKETS}); use a larger bucket")
+        now = time.time() if now is None else now
+        start = now - range_s
+        ts, prices = self._series(symbol, start, now)
+        empty = {'bucket_start': [], 'open': [], 'high': [], 'low': [], 'close': [], 'count': []}
+        if ts.size == 0:
+            return empty
+
+        bucket_ms = int(bucket_s * 1000)
+        origin = int(start * 1000) // bucket_ms * bucket_ms
+        bucket = (ts - origin) // bucket_ms
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        ends = np.r_[starts[1:], ts.size] - 1
+        return {
+            'bucket_start': ((origin + bucket[starts] * bucket_ms) / 1000.0).tolist(),
+            'open': prices[starts].tolist(),
+            'high': np.maximum.reduceat(prices, starts).tolist(),
+            'low': np.minimum.reduceat(prices, starts).tolist(),
+            'close': prices[ends].tolist(),
+            'count': (ends - starts + 1).tolist(),
+        }
@@ -0,0 +1,383 @@
+"""
+On-demand request profiling for ml_api_server.py and portfolio_api_server.py.
+
+A request is profiled when either
+- it carries ``X-Profile: sample`` (or ``trace``) together with
+  ``X-Profile-Token`` matching ``PROFILE_ADMIN_TOKEN``, or
+- it is picked by the random ``PROFILE_SAMPLE_RATE`` fraction (sampling mode).
+
+Modes:
+- ``sample``: a side thread snapshots the handler thread's stack every
+  ``PROFILE_INTERVAL_MS`` (low overhead, statistical)
+- ``trace``:  ``sys.setprofile`` on the handler thread attributes elapsed
+  microseconds to every call stack (exact, slower)
+
+Both produce collapsed stacks (``frame;frame;frame weight`` per line), the
+input format of flamegraph.pl / speedscope. The most recent
+``PROFILE_RING_SIZE`` profiles are kept on disk under ``PROFILE_DIR`` and are
+listed and downloaded through ``/admin/profiles`` (token required); those
+admin requests are never profiled themselves, and profiles without a single
+sample are not stored.
+
+Profiled /predict requests bypass micro-batching (see ``profiling_active``) so
+the forest inference runs, and is sampled, on the request's own thread rather
+than on the batch worker.
+
+When neither a token nor a sample rate is configured the servers install no
+hooks at all, so disabled profiling costs nothing per request.
+"""
+
+import contextvars
+import functools
+import hmac
+import inspect
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+PROFILE_HEADER = 'X-Profile'
+TOKEN_HEADER = 'X-Profile-Token'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+ADMIN_PATH = '/admin/profiles'
+
+
+class ProfilingConfig:
+    """Profiling settings read from the environment."""
+
+    def __init__(self, server_name, token=None, sample_rate=0.0, interval_ms=1.0,
+                 ring_size=50, directory=None):
+        self.server_name = server_name
+        self.token = token or None
+        self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        self.interval = max(0.1, float(interval_ms)) / 1000.0
+        self.ring_size = max(1, int(ring_size))
+        self.directory = directory or os.path.join(
+            tempfile.gettempdir(), 'moneyplan-profiles', server_name)
+
+    @classmethod
+    def from_env(cls, server_name):
+        return cls(
+            server_name,
+            token=os.environ.get('PROFILE_ADMIN_TOKEN'),
+            sample_rate=os.environ.get('PROFILE_SAMPLE_RATE', '0'),
+            interval_ms=os.environ.get('PROFILE_INTERVAL_MS', '1'),
+            ring_size=os.environ.get('PROFILE_RING_SIZE', '50'),
+            directory=os.environ.get('PROFILE_DIR'),
+        )
+
+    @property
+    def enabled(self):
+        return self.token is not None or self.sample_rate > 0
+
+    def authorized(self, token):
+        return self.token is not None and hmac.compare_digest(
+            str(token or '').encode('utf-8'), self.token.encode('utf-8'))
+
+    def requested_mode(self, headers, path=''):
+        """'sample', 'trace' or None for a request with the given headers mapping and path."""
+        if path == ADMIN_PATH or path.startswith(ADMIN_PATH + '/'):
+            return None
+        value = (headers.get(PROFILE_HEADER) or '').strip().lower()
+        if value and self.authorized(headers.get(TOKEN_HEADER)):
+            return 'trace' if value in ('trace', 'deterministic') else 'sample'
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'sample'
+        return None
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _fold(frame):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class SamplingProfiler:
+    """Periodically snapshot one thread's stack from a side thread."""
+
+    def __init__(self, interval, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_fold(frame)] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+class TracingProfiler:
+    """Deterministic profiler: microseconds spent in every exact call stack."""
+
+    def __init__(self):
+        self.stacks = Counter()
+        self._stack = []
+        self._last = 0.0
+
+    def _callback(self, frame, event, arg):
+        now = time.perf_counter()
+        if self._stack:
+            self.stacks[';'.join(self._stack)] += int((now - self._last) * 1e6)
+        if event == 'call':
+            self._stack.append(_frame_label(frame.f_code))
+        elif event == 'c_call':
+            self._stack.append(f"{getattr(arg, '__qualname__', repr(arg))} (builtin)")
+        elif event in ('return', 'c_return', 'c_exception') and self._stack:
+            self._stack.pop()
+        self._last = time.perf_counter()
+
+    def start(self):
+        self._last = time.perf_counter()
+        sys.setprofile(self._callback)
+        return self
+
+    def stop(self):
+        sys.setprofile(None)
+        return Counter({k: v for k, v in self.stacks.items() if v > 0})
+
+
+def start_profiler(mode, config):
+    """Start profiling the calling thread; call .stop() on the same thread."""
+    if mode == 'trace':
+        return TracingProfiler().start()
+    return SamplingProfiler(config.interval).start()
+
+
+class ProfileRing:
+    """Bounded directory of recent profiles in collapsed-stack format."""
+
+    _SAFE = re.compile(r'[^A-Za-z0-9_.-]+')
+
+    def __init__(self, directory, size):
+        self.directory = directory
+        self.size = size
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def save(self, method, path, mode, stacks, duration_ms):
+        """Write one profile and drop the oldest beyond the ring size; returns its id.
+
+        Returns None without writing anything when ``stacks`` is empty.
+        """
+        if not stacks:
+            return None
+        with self._lock:
+            self._seq += 1
+            slug = self._SAFE.sub('_', path.strip('/')) or 'root'
+            # The file holds nothing but stacks, so request details live in the id
+            profile_id = (f"{int(time.time() * 1000)}-{self._seq:06d}-{method}-{slug}"
+                          f"-{mode}-{duration_ms:.0f}ms")
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, profile_id + '.folded'), 'w') as f:
+                for stack, weight in stacks.most_common():
+                    f.write(f"{stack} {weight}\n")
+            for old in self._files()[:-self.size]:
+                try:
+                    os.remove(os.path.join(self.directory, old))
+                except OSError:
+                    pass
+        return profile_id
+
+    def _files(self):
+        try:
+            return sorted(n for n in os.listdir(self.directory) if n.endswith('.folded'))
+        except OSError:
+            return []
+
+    def list(self):
+        """Stored profile ids, newest first."""
+        return [n[:-len('.folded')] for n in reversed(self._files())]
+
+    def path_for(self, profile_id):
+        """File path for a stored profile id, or None."""
+        name = os.path.basename(profile_id) + '.folded'
+        path = os.path.join(self.directory, name)
+        return path if os.path.exists(path) else None
+
+
+def install_flask(app, config):
+    """Register profiling hooks and /admin/profiles routes on a Flask app."""
+    from flask import g, jsonify, request, send_file
+
+    ring = ProfileRing(config.directory, config.ring_size)
+
+    @app.before_request
+    def _start_request_profile():
+        mode = config.requested_mode(request.headers, request.path)
+        if mode:
+            g.request_profile = (mode, time.perf_counter(), start_profiler(mode, config),
+                                 _ACTIVE_PROFILE.set(_ActiveProfile(mode, config)))
+
+    @app.after_request
+    def _finish_request_profile(response):
+        active = g.pop('request_profile', None)
+        if active is not None:
+            mode, started, profiler, token = active
+            stacks = _stop_flask_profile(profiler, token)
+            duration_ms = (time.perf_counter() - started) * 1000.0
+            profile_id = ring.save(request.method, request.path, mode, stacks, duration_ms)
+            if profile_id is not None:
+                response.headers[PROFILE_ID_HEADER] = profile_id
+        return response
+
+    @app.teardown_request
+    def _discard_request_profile(exc):
+        # Requests that never reached after_request must not leave a profiler running
+        active = g.pop('request_profile', None)
+        if active is not None:
+            _stop_flask_profile(active[2], active[3])
+
+    @app.route(ADMIN_PATH, methods=['GET'])
+    def list_profiles():
+        """Recent request profiles (requires X-Profile-Token)"""
+        if not config.authorized(request.headers.get(TOKEN_HEADER)):
+            return jsonify({'error': 'Forbidden'}), 403
+        return jsonify({'profiles': ring.list()})
+
+    @app.route(ADMIN_PATH + '/<profile_id>', methods=['GET'])
+    def download_profile(profile_id):
+        """One profile as collapsed stacks (requires X-Profile-Token)"""
+        if not config.authorized(request.headers.get(TOKEN_HEADER)):
+            return jsonify({'error': 'Forbidden'}), 403
+        path = ring.path_for(profile_id)
+        if path is None:
+            return jsonify({'error': 'Profile not found'}), 404
+        return send_file(path, mimetype='text/plain', as_attachment=True)
+
+    return ring
+
+
+class _ActiveProfile:
+    def __init__(self, mode, config):
+        self.mode = mode
+        self.config = config
+        self.stacks = None
+
+
+# Profile requested for the current request, read by the endpoint wrappers
+_ACTIVE_PROFILE = contextvars.ContextVar('active_profile', default=None)
+
+
+def profiling_active():
+    """True while the current request is being profiled."""
+    return _ACTIVE_PROFILE.get() is not None
+
+
+def _stop_flask_profile(profiler, token):
+    try:
+        return profiler.stop()
+    finally:
+        _ACTIVE_PROFILE.reset(token)
+
+
+def _wrap_endpoint(fn):
+    # Profiles are taken around the endpoint call itself so that sync endpoints
+    # are profiled on the threadpool thread that actually runs them.
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            active = _ACTIVE_PROFILE.get()
+            if active is None:
+                return await fn(*args, **kwargs)
+            profiler = start_profiler(active.mode, active.config)
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                active.stacks = profiler.stop()
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            active = _ACTIVE_PROFILE.get()
+            if active is None:
+                return fn(*args, **kwargs)
+            profiler = start_profiler(active.mode, active.config)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                active.stacks = profiler.stop()
+    wrapper.profiled = True
+    return wrapper
+
+
+def install_fastapi(app, config):
+    """Add profiling middleware and /admin/profiles routes to a FastAPI app.
+
+    Call after all routes are registered: existing endpoints are wrapped.
+    """
+    from fastapi import Request
+    from fastapi.responses import FileResponse, JSONResponse
+    from fastapi.routing import APIRoute
+
+    ring = ProfileRing(config.directory, config.ring_size)
+
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        mode = config.requested_mode(request.headers, request.url.path)
+        if mode is None:
+            return await call_next(request)
+        active = _ActiveProfile(mode, config)
+        token = _ACTIVE_PROFILE.set(active)
+        started = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            _ACTIVE_PROFILE.reset(token)
+        if active.stacks is not None:
+            duration_ms = (time.perf_counter() - started) * 1000.0
+            profile_id = ring.save(request.method, request.url.path, mode, active.stacks, duration_ms)
+            if profile_id is not None:
+                response.headers[PROFILE_ID_HEADER] = profile_id
+        return response
+
+    @app.get(ADMIN_PATH, include_in_schema=False)
+    def list_profiles(request: Request):
+        if not config.authorized(request.headers.get(TOKEN_HEADER)):
+            return JSONResponse({"error": "Forbidden"}, status_code=403)
+        return {"profiles": ring.list()}
+
+    @app.get(ADMIN_PATH + "/{profile_id}", include_in_schema=False)
+    def download_profile(profile_id: str, request: Request):
+        if not config.authorized(request.headers.get(TOKEN_HEADER)):
+            return JSONResponse({"error": "Forbidden"}, status_code=403)
+        path = ring.path_for(profile_id)
+        if path is None:
+            return JSONResponse({"error": "Profile not found"}, status_code=404)
+        return FileResponse(path, media_type="text/plain", filename=os.path.basename(path))
+
+    for route in _api_routes(app.router.routes, APIRoute):
+        if not getattr(route.dependant.call, 'profiled', False):
+            route.dependant.call = _wrap_endpoint(route.dependant.call)
+            # Included routers build their handlers from the endpoint on first use
+            route.endpoint = route.dependant.call
+    return ring
+
+
+def _api_routes(routes, route_type):
+    # Newer FastAPI keeps included routers as a reference to the original router
+    for route in routes:
+        if isinstance(route, route_type):
+            yield route
+        elif hasattr(route, 'original_router'):
+            yield from _api_routes(route.original_router.routes, route_type)
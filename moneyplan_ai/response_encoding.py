@@ -0,0 +1,235 @@
+"""
+Content negotiation for API responses.
+
+JSON stays the default. Clients that send ``Accept: application/msgpack`` or
+``Accept: application/vnd.apache.arrow.stream`` get the same payload as
+MessagePack or as an Arrow IPC stream; large bodies are gzip-compressed when
+the client sends ``Accept-Encoding: gzip``.
+
+MessagePack and Arrow are optional: if ``msgpack`` / ``pyarrow`` are not
+installed the corresponding formats are simply never negotiated.
+
+Used by both ml_api_server.py (Flask) and portfolio_api_server.py (FastAPI).
+"""
+
+import dataclasses
+import decimal
+import email.utils
+import gzip
+import json
+import uuid
+from datetime import date, datetime, time, timezone
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+ARROW = 'application/vnd.apache.arrow.stream'
+
+# Alternative spellings clients use for the same formats
+_ALIASES = {
+    'application/x-msgpack': MSGPACK,
+    'application/vnd.msgpack': MSGPACK,
+    'application/vnd.apache.arrow.file': ARROW,
+}
+
+# Bodies smaller than this are sent uncompressed
+GZIP_MIN_SIZE = 4096
+GZIP_LEVEL = 5
+
+
+def available_formats():
+    """Media types this process can produce, in server preference order."""
+    formats = [JSON]
+    if msgpack is not None:
+        formats.append(MSGPACK)
+    if pa is not None:
+        formats.append(ARROW)
+    return formats
+
+
+def parse_accept(header):
+    """Return media types from an Accept header, best quality first."""
+    if not header:
+        return []
+    ranked = []
+    for position, part in enumerate(header.split(',')):
+        fields = [f.strip() for f in part.split(';')]
+        media_type = fields[0].lower()
+        if not media_type:
+            continue
+        quality = 1.0
+        for param in fields[1:]:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            ranked.append((-quality, position, _ALIASES.get(media_type, media_type)))
+    return [media_type for _, _, media_type in sorted(ranked)]
+
+
+def negotiate(accept_header):
+    """Ordered list of formats to try for this request; JSON is always last resort."""
+    offered = available_formats()
+    chosen = [m for m in parse_accept(accept_header) if m in offered]
+    if JSON not in chosen:
+        chosen.append(JSON)
+    return chosen
+
+
+def _http_date(value):
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time())
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return email.utils.format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def _msgpack_default(obj):
+    """Numpy values plus the conversions Flask's JSON provider makes, so every format agrees."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, date):
+        return _http_date(obj)
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not MessagePack serializable")
+
+
+def _is_columnar(block):
+    if not isinstance(block, dict) or not block:
+        return False
+    lengths = {len(v) for v in block.values() if isinstance(v, list)}
+    return len(lengths) == 1 and all(isinstance(v, list) for v in block.values())
+
+
+def _is_records(block):
+    # from_pylist infers the schema from the first row, so every row must share its keys
+    if not (isinstance(block, list) and block and all(isinstance(r, dict) for r in block)):
+        return False
+    keys = block[0].keys()
+    return all(r.keys() == keys for r in block)
+
+
+def _cell_count(block):
+    if isinstance(block, dict):
+        return sum(len(v) for v in block.values())
+    first = block[0]
+    return len(block) * sum(len(v) if isinstance(v, list) else 1 for v in first.values())
+
+
+def _arrow_table(payload):
+    """Pick the tabular part of a payload; everything else becomes metadata.
+
+    Supported shapes: a list of records, a dict of equal-length columns, or a
+    dict holding such blocks (lists of records or column dicts) among other
+    fields, e.g. ``{"count": 3, "predictions": [...]}``. When there are
+    several blocks the largest becomes the table and the rest travel as JSON
+    in the schema metadata. Returns ``(table, layout)`` or None.
+    """
+    if isinstance(payload, list):
+        if _is_records(payload):
+            return pa.Table.from_pylist(payload), {'orient': 'records'}
+        return None
+    if not isinstance(payload, dict):
+        return None
+    if _is_columnar(payload):
+        return pa.Table.from_pydict(payload), {'orient': 'columns'}
+
+    blocks = [k for k, v in payload.items() if _is_records(v) or _is_columnar(v)]
+    if not blocks:
+        return None
+    key = max(blocks, key=lambda k: _cell_count(payload[k]))
+    block = payload[key]
+    if isinstance(block, list):
+        table, orient = pa.Table.from_pylist(block), 'records'
+    else:
+        table, orient = pa.Table.from_pydict(block), 'columns'
+    rest = {k: v for k, v in payload.items() if k != key}
+    return table, {'orient': orient, 'key': key, 'rest': rest}
+
+
+def _encode_arrow(payload):
+    """Arrow IPC stream of ``payload``, or None if it has no table Arrow can type."""
+    try:
+        found = _arrow_table(payload)
+        if found is None:
+            return None
+        table, layout = found
+        table = table.replace_schema_metadata(
+            {'moneyplan': json.dumps(layout, default=_msgpack_default)})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    except pa.ArrowException:
+        # Mixed-type columns, non-string dict keys, unknown objects, ...
+        return None
+    return sink.getvalue().to_pybytes()
+
+
+def encode(payload, formats):
+    """Encode ``payload`` with the first format in ``formats`` that can represent it.
+
+    Arrow is skipped when the payload is not tabular or its columns cannot be
+    typed. Returns ``(body, media_type)`` or ``None`` if only JSON is left, so
+    callers can fall back to their framework's own JSON encoder.
+    """
+    for media_type in formats:
+        if media_type == MSGPACK:
+            return msgpack.packb(payload, default=_msgpack_default, use_bin_type=True), MSGPACK
+        if media_type == ARROW:
+            body = _encode_arrow(payload)
+            if body is not None:
+                return body, ARROW
+        if media_type == JSON:
+            return None
+    return None
+
+
+def accepts_gzip(accept_encoding):
+    """True if the Accept-Encoding header allows gzip."""
+    for part in (accept_encoding or '').split(','):
+        fields = [f.strip() for f in part.split(';')]
+        if fields[0].lower() in ('gzip', '*'):
+            return not any(p in ('q=0', 'q=0.0') for p in fields[1:])
+    return False
+
+
+def maybe_gzip(body, accept_encoding, min_size=GZIP_MIN_SIZE):
+    """Compressed body if worthwhile and accepted by the client, else None."""
+    if len(body) < min_size or not accepts_gzip(accept_encoding):
+        return None
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def decode(body, media_type):
+    """Inverse of encode() for clients and benchmarks written in Python."""
+    media_type = _ALIASES.get(media_type, media_type)
+    if media_type == MSGPACK:
+        return msgpack.unpackb(body, raw=False)
+    if media_type == ARROW:
+        table = pa.ipc.open_stream(body).read_all()
+        layout = json.loads((table.schema.metadata or {}).get(b'moneyplan', b'{}'))
+        rows = table.to_pylist() if layout.get('orient') == 'records' else table.to_pydict()
+        if 'key' not in layout:
+            return rows
+        return {**layout['rest'], layout['key']: rows}
+    return json.loads(body)
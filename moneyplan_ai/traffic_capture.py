@@ -0,0 +1,183 @@
+"""
+Optional traffic capture for ml_api_server.py and portfolio_api_server.py.
+
+With ``TRAFFIC_CAPTURE_PATH`` set, every request is appended to that file as
+one compact JSON line: arrival time, method, path, query string, the headers
+that affect the response, the (redacted) JSON body, status and server-side
+latency. ``benchmarks/replay.py`` plays a capture back against one or two
+builds. Without the variable no hooks are installed.
+
+Redaction is format-preserving so replays exercise the same code paths
+(e.g. CIBIL feature derivation still sees a valid PAN and the same mobile
+prefix and birth year), but no original PII is written:
+- PAN: replaced by a keyed-hash-derived PAN of the same validity
+- mobile / phone: first digit kept, the rest keyed-hash-derived
+- names / e-mail: replaced by same-length placeholders
+- date of birth: year kept, day and month dropped
+
+The hash is an HMAC under a random key generated when the process starts and
+never written anywhere: a value maps to the same stand-in throughout one
+capture, but stand-ins cannot be brute-forced back to the (small) space of
+PANs or mobile numbers.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import threading
+import time
+
+CAPTURE_HEADERS = ('accept', 'accept-encoding', 'content-type')
+
+_PAN = re.compile(r'^[A-Z]{5}[0-9]{4}[A-Z]$')
+_YEAR = re.compile(r'(\d{4})')
+
+# Per-process HMAC key for stand-ins; kept in memory only
+_KEY = secrets.token_bytes(32)
+
+
+def _digest(value):
+    return hmac.new(_KEY, str(value).encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def _fake_pan(value):
+    text = str(value).strip().upper()
+    h = _digest(text)
+    if not _PAN.match(text):
+        return 'INVALID' + h[:3].upper()
+    letters = ''.join(chr(ord('A') + int(c, 16) % 26) for c in h[:6])
+    digits = ''.join(str(int(c, 16) % 10) for c in h[6:10])
+    return letters[:5] + digits + letters[5]
+
+
+def _fake_phone(value):
+    text = str(value).strip()
+    if not text:
+        return text
+    digits = ''.join(str(int(c, 16) % 10) for c in _digest(text))
+    return text[0] + digits[:max(len(text) - 1, 0)]
+
+
+def _fake_dob(value):
+    match = _YEAR.search(str(value))
+    return f"{match.group(1)}-01-01" if match else ''
+
+
+def _placeholder(value):
+    return 'X' * len(str(value))
+
+
+_REDACTORS = {
+    'pan_number': _fake_pan,
+    'pan': _fake_pan,
+    'mobile_number': _fake_phone,
+    'mobile': _fake_phone,
+    'phone': _fake_phone,
+    'phone_number': _fake_phone,
+    'full_name': _placeholder,
+    'name': _placeholder,
+    'email': _placeholder,
+    'email_address': _placeholder,
+    'date_of_birth': _fake_dob,
+    'dob': _fake_dob,
+}
+
+
+def redact(obj):
+    """Copy of a JSON value with PII fields replaced (see module docstring)."""
+    if isinstance(obj, dict):
+        out = {}
+        for key, value in obj.items():
+            fn = _REDACTORS.get(str(key).lower())
+            if fn is not None and isinstance(value, (str, int, float)):
+                out[key] = fn(value)
+            else:
+                out[key] = redact(value)
+        return out
+    if isinstance(obj, list):
+        return [redact(v) for v in obj]
+    return obj
+
+
+class CaptureLog:
+    """Thread-safe JSON-lines appender."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'a', buffering=1)
+
+    def record(self, method, path, query, headers, body, status, latency_ms, arrived):
+        try:
+            parsed = json.loads(body) if body else None
+            entry_body = redact(parsed)
+            raw = None
+        except ValueError:
+            # Non-JSON bodies are not replayable without the original bytes; keep only their size
+            entry_body, raw = None, len(body)
+        entry = {
+            't': round(arrived, 6),
+            'method': method,
+            'path': path,
+            'query': query,
+            'headers': {k: v for k, v in headers.items() if k.lower() in CAPTURE_HEADERS},
+            'body': entry_body,
+            'status': status,
+            'latency_ms': round(latency_ms, 3),
+        }
+        if raw is not None:
+            entry['raw_body_bytes'] = raw
+        line = json.dumps(entry, separators=(',', ':'))
+        with self._lock:
+            self._file.write(line + '\n')
+
+
+def capture_path_from_env():
+    return os.environ.get('TRAFFIC_CAPTURE_PATH') or None
+
+
+def install_flask(app, path):
+    """Record every request handled by a Flask app."""
+    from flask import g, request
+
+    log = CaptureLog(path)
+
+    @app.before_request
+    def _capture_start():
+        g.capture_started = (time.time(), time.perf_counter())
+
+    @app.after_request
+    def _capture_finish(response):
+        started = g.pop('capture_started', None)
+        if started is not None:
+            arrived, t0 = started
+            log.record(request.method, request.path, request.query_string.decode('latin-1'),
+                       {k.lower(): v for k, v in request.headers.items()},
+                       request.get_data(cache=True), response.status_code,
+                       (time.perf_counter() - t0) * 1000.0, arrived)
+        return response
+
+    return log
+
+
+def install_fastapi(app, path):
+    """Record every request handled by a FastAPI app."""
+    from fastapi import Request
+
+    log = CaptureLog(path)
+
+    @app.middleware("http")
+    async def capture_request(request: Request, call_next):
+        arrived, t0 = time.time(), time.perf_counter()
+        body = await request.body()
+        response = await call_next(request)
+        log.record(request.method, request.url.path, request.url.query,
+                   dict(request.headers), body, response.status_code,
+                   (time.perf_counter() - t0) * 1000.0, arrived)
+        return response
+
+    return log
@@ -0,0 +1,351 @@
+"""
+Per-prediction feature contributions for the loan and CIBIL forests.
+
+Tree-path attribution: as a row walks down a tree, every split moves the
+node output (class probabilities, or the regression value) from the parent's
+value to the child's, and that change is credited to the split feature.
+Averaged over the forest this decomposes each prediction exactly:
+
+    output = bias + sum of the row's feature contributions
+
+where ``bias`` is the mean root value (the training base rate).
+
+Node values are read in place from the model (sklearn's ``tree_`` arrays, or
+a CompactForest's float32 leaf values plus its internal node values), one
+tree at a time, so explaining needs no copy of the forest. Each request walks
+the rows' decision paths tree by tree.
+
+The per-feature sums along the path to each leaf are fixed once the model is
+trained, so ``prepare`` can tabulate them next to the leaf values when they
+fit in ``max_bytes``. An explained prediction then needs the same single
+traversal as a plain one (``apply``: the leaf each row reaches in each tree);
+the prediction and its contributions are both averages over those leaves,
+computed together as one sparse (rows x leaves) product. The servers build
+the table in the background, on the first explained request or, when asked
+to, at model load.
+
+Supported models: fitted sklearn forests or single trees, and CompactForest
+(compact_forest.py) files exported with leaf weights.
+"""
+
+import logging
+import threading
+import weakref
+
+import numpy as np
+from scipy import sparse
+
+from compact_forest import CompactForest, _trees_of
+
+logger = logging.getLogger(__name__)
+
+# Largest path table prepare() builds by default
+MAX_TABLE_BYTES = 256 * 2**20
+
+# Tree accessors / PathTables per model, and models whose table was requested
+_TREES = weakref.WeakKeyDictionary()
+_TABLES = weakref.WeakKeyDictionary()
+_REQUESTED = weakref.WeakSet()
+# Guards the dictionaries only; nothing is built while holding it
+_LOCK = threading.Lock()
+
+
+class _SklearnTrees:
+    """Node arrays of a fitted sklearn forest or tree, read from ``tree_`` in place."""
+
+    def __init__(self, estimator):
+        self.estimator = estimator
+        self.trees = [tree.tree_ for tree in _trees_of(estimator)]
+        self.is_classifier = hasattr(estimator, 'classes_')
+        self.n_trees = len(self.trees)
+        self.n_features = int(getattr(estimator, 'n_features_in_',
+                                      max(int(t.feature.max()) for t in self.trees) + 1))
+        self.n_outputs = self.trees[0].value.shape[2]
+        self.n_leaves = [int(t.n_leaves) for t in self.trees]
+        self.node_offsets = np.r_[0, np.cumsum([t.node_count for t in self.trees])[:-1]].astype(np.int64)
+        self.n_nodes = sum(t.node_count for t in self.trees)
+        self.bias = np.mean([self.values(t, [0])[0] for t in range(self.n_trees)], axis=0)
+        self._leaf_of_node = None
+
+    def extra_table_bytes(self):
+        # A PathTable also keeps a copy of the leaf values and a node -> leaf map
+        return (sum(self.n_leaves) * self.n_outputs + self.n_nodes) * 8
+
+    def children(self, t):
+        tree = self.trees[t]
+        return tree.children_left, tree.children_right, tree.feature
+
+    def values(self, t, nodes):
+        """float64 outputs of nodes ``nodes`` of tree ``t`` (class fractions for classifiers)."""
+        value = self.trees[t].value[nodes, 0, :]
+        if self.is_classifier:
+            totals = value.sum(axis=1, keepdims=True)
+            value = value / np.where(totals == 0, 1.0, totals)
+        return value
+
+    def leaf_rows(self, t):
+        """Leaf node ids of tree ``t`` and their rows in a PathTable."""
+        leaves = np.flatnonzero(self.trees[t].children_left < 0)
+        start = sum(self.n_leaves[:t])
+        return leaves, np.arange(start, start + leaves.size)
+
+    def leaf_values(self):
+        return np.concatenate([self.values(t, self.leaf_rows(t)[0]) for t in range(self.n_trees)])
+
+    def reached_rows(self, X):
+        """PathTable row of the leaf each row of ``X`` reaches in each tree."""
+        if self._leaf_of_node is None:
+            leaf_of_node = np.full(self.n_nodes, -1, dtype=np.int64)
+            for t in range(self.n_trees):
+                leaves, rows = self.leaf_rows(t)
+                leaf_of_node[self.node_offsets[t] + leaves] = rows
+            self._leaf_of_node = leaf_of_node
+        reached = np.asarray(self.estimator.apply(X))
+        return self._leaf_of_node[reached.reshape(reached.shape[0], -1) + self.node_offsets]
+
+    def paths(self, X):
+        """(tree, rows, nodes) per tree: every node on each row's path, rows ascending, root first."""
+        if hasattr(self.estimator, 'estimators_'):
+            indicator, node_ptr = self.estimator.decision_path(X)
+        else:
+            indicator, node_ptr = self.estimator.decision_path(X), np.array([0, self.trees[0].node_count])
+        indicator = indicator.tocsr()
+        indicator.sort_indices()
+        rows = np.repeat(np.arange(indicator.shape[0]), np.diff(indicator.indptr))
+        nodes = indicator.indices.astype(np.int64)
+        # Node ids grow from parent to child, so sorted ids are in path order
+        tree_of = np.searchsorted(node_ptr, nodes, side='right') - 1
+        order = np.argsort(tree_of, kind='stable')
+        bounds = np.searchsorted(tree_of[order], np.arange(self.n_trees + 1))
+        for t in range(self.n_trees):
+            selected = order[bounds[t]:bounds[t + 1]]
+            yield t, rows[selected], nodes[selected] - node_ptr[t]
+
+
+class _CompactTrees:
+    """Node arrays of a CompactForest; leaf values stay in the forest's float32 array."""
+
+    def __init__(self, forest):
+        self.forest = forest
+        self.internal_row, self.internal_values = forest.internal_node_values()
+        self.n_trees = forest.n_estimators
+        self.n_features = forest.n_features_in_
+        self.n_outputs = forest.leaf_values.shape[1]
+        self.node_ends = np.r_[forest.node_offsets[1:], forest.left.size]
+        self.n_leaves = np.diff(np.r_[forest.leaf_offsets, forest.leaf_values.shape[0]]).tolist()
+        self.bias = np.mean([self.values(t, [0])[0] for t in range(self.n_trees)], axis=0)
+
+    def extra_table_bytes(self):
+        # The table reuses the forest's leaf values, and apply() returns table rows
+        return 0
+
+    def children(self, t):
+        start, end = self.forest.node_offsets[t], self.node_ends[t]
+        return self.forest.left[start:end], self.forest.right[start:end], self.forest.feature[start:end]
+
+    def values(self, t, nodes):
+        """float64 outputs of nodes ``nodes`` of tree ``t``."""
+        nodes = np.asarray(nodes) + self.forest.node_offsets[t]
+        left = self.forest.left[nodes].astype(np.int64)
+        is_leaf = left < 0
+        value = np.empty((nodes.size, self.n_outputs))
+        value[is_leaf] = self.forest.leaf_values[~left[is_leaf] + self.forest.leaf_offsets[t]]
+        value[~is_leaf] = self.internal_values[self.internal_row[nodes[~is_leaf]]]
+        return value
+
+    def leaf_rows(self, t):
+        left = self.children(t)[0].astype(np.int64)
+        leaves = np.flatnonzero(left < 0)
+        return leaves, ~left[leaves] + self.forest.leaf_offsets[t]
+
+    def leaf_values(self):
+        return self.forest.leaf_values
+
+    def reached_rows(self, X):
+        return self.forest.apply(X)
+
+    def paths(self, X):
+        """(tree, rows, nodes) per tree: every node on each row's path, rows ascending, root first."""
+        X = self.forest._as_matrix(X)
+        for t in range(self.n_trees):
+            left, right, feature = self.children(t)
+            threshold = self.forest.threshold[self.forest.node_offsets[t]:self.node_ends[t]]
+            active = np.arange(X.shape[0])
+            node = np.zeros(X.shape[0], dtype=np.int64)
+            visited_rows, visited_nodes = [], []
+            while active.size:
+                visited_rows.append(active)
+                visited_nodes.append(node[active])
+                here = node[active]
+                internal = left[here] >= 0
+                active, here = active[internal], here[internal]
+                go_left = X[active, feature[here]] <= threshold[here]
+                node[active] = np.where(go_left, left[here], right[here])
+            rows = np.concatenate(visited_rows)
+            order = np.argsort(rows, kind='stable')
+            yield t, rows[order], np.concatenate(visited_nodes)[order]
+
+
+def _walk(trees, X):
+    """(outputs, contributions) for rows ``X``, summed along each tree's decision paths."""
+    outputs = np.zeros((len(X), trees.n_outputs))
+    contributions = np.zeros((len(X), trees.n_features, trees.n_outputs))
+    for t, rows, nodes in trees.paths(X):
+        value = trees.values(t, nodes)
+        feature = trees.children(t)[2]
+        step = rows[1:] == rows[:-1]
+        np.add.at(contributions, (rows[1:][step], feature[nodes[:-1][step]]),
+                  value[1:][step] - value[:-1][step])
+        leaf = np.r_[~step, True]
+        outputs[rows[leaf]] += value[leaf]
+    return outputs / trees.n_trees, contributions / trees.n_trees
+
+
+class PathTable:
+    """Leaf values and root-to-leaf contribution sums of one forest."""
+
+    def __init__(self, trees):
+        n_outputs = trees.n_outputs
+        leaf_paths = np.zeros((sum(trees.n_leaves), trees.n_features, n_outputs))
+        # Tree by tree, top-down one level at a time; only the current level's paths are kept
+        for t in range(trees.n_trees):
+            left, right, feature = trees.children(t)
+            leaves, rows = trees.leaf_rows(t)
+            row_of = np.full(left.size, -1, dtype=np.int64)
+            row_of[leaves] = rows
+            level = np.zeros(1, dtype=np.int64)
+            level_values = trees.values(t, level)
+            level_paths = np.zeros((1, trees.n_features, n_outputs))
+            while level.size:
+                is_leaf = left[level] < 0
+                leaf_paths[row_of[level[is_leaf]]] = level_paths[is_leaf]
+                parents = level[~is_leaf]
+                parent_values, parent_paths = level_values[~is_leaf], level_paths[~is_leaf]
+                split = feature[parents]
+                children, child_values, child_paths = [], [], []
+                for child in (left[parents].astype(np.int64), right[parents].astype(np.int64)):
+                    value = trees.values(t, child)
+                    paths = parent_paths.copy()
+                    paths[np.arange(parents.size), split] += value - parent_values
+                    children.append(child)
+                    child_values.append(value)
+                    child_paths.append(paths)
+                level = np.concatenate(children)
+                level_values = np.concatenate(child_values)
+                level_paths = np.concatenate(child_paths)
+
+        self.trees = trees
+        self.leaf_values = trees.leaf_values()
+        self.leaf_paths = leaf_paths.reshape(leaf_paths.shape[0], -1)
+
+    @staticmethod
+    def nbytes(trees):
+        """Memory a PathTable of ``trees`` holds, plus its largest per-tree working set."""
+        row = trees.n_features * trees.n_outputs * 8
+        return sum(trees.n_leaves) * row + 3 * max(trees.n_leaves) * row + trees.extra_table_bytes()
+
+    def predict(self, X):
+        """(outputs, contributions) for rows ``X``."""
+        reached = self.trees.reached_rows(X)
+        n_rows, n_trees = reached.shape
+        hits = sparse.csr_matrix(
+            (np.ones(reached.size), reached.ravel(), np.arange(0, reached.size + 1, n_trees)),
+            shape=(n_rows, self.leaf_values.shape[0]))
+        outputs = (hits @ self.leaf_values) / n_trees
+        contributions = (hits @ self.leaf_paths) / n_trees
+        return outputs, contributions.reshape(n_rows, self.trees.n_features, -1)
+
+
+def forest_trees(model):
+    """Cached tree accessor of a model; ValueError if it is not a supported tree ensemble."""
+    with _LOCK:
+        trees = _TREES.get(model)
+    if trees is None:
+        # Built outside the lock; a concurrent first call may build a duplicate, which is dropped
+        trees = _CompactTrees(model) if isinstance(model, CompactForest) else _SklearnTrees(model)
+        with _LOCK:
+            trees = _TREES.setdefault(model, trees)
+    return trees
+
+
+def prepare(model, max_bytes=MAX_TABLE_BYTES):
+    """Build and cache the path table of ``model`` unless it would exceed ``max_bytes``.
+
+    Returns True when a table is available. Raises ValueError for models that
+    are not tree ensembles.
+    """
+    with _LOCK:
+        if model in _TABLES:
+            return True
+    trees = forest_trees(model)
+    needed = PathTable.nbytes(trees)
+    if needed > max_bytes:
+        logger.info(f"Path table would need {needed / 2**20:.0f} MB "
+                    f"(limit {max_bytes / 2**20:.0f} MB); explanations walk the trees instead")
+        return False
+    table = PathTable(trees)
+    with _LOCK:
+        _TABLES[model] = table
+    return True
+
+
+def prepare_in_background(model, max_bytes=MAX_TABLE_BYTES):
+    """Run prepare() once per model on a daemon thread; None if it was already requested."""
+    with _LOCK:
+        if model in _REQUESTED:
+            return None
+        _REQUESTED.add(model)
+
+    def run():
+        try:
+            prepare(model, max_bytes)
+        except ValueError as e:
+            logger.info(f"No feature contributions for this model: {e}")
+        except Exception as e:
+            logger.error(f"Building the path table failed: {e}")
+
+    thread = threading.Thread(target=run, name='path-table', daemon=True)
+    thread.start()
+    return thread
+
+
+def predict_with_contributions(model, X):
+    """(outputs, bias, contributions) for rows ``X``.
+
+    ``outputs`` is (n_rows, n_outputs): class probabilities for classifiers
+    (as predict_proba), the predicted value for regressors. ``bias`` is
+    (n_outputs,) and ``contributions`` (n_rows, n_features, n_outputs), with
+    features in the model's order (see ``feature_names``). Uses the path
+    table when prepare() has built one and never builds it itself. Raises
+    ValueError for models that are not tree ensembles.
+    """
+    trees = forest_trees(model)
+    with _LOCK:
+        table = _TABLES.get(model)
+    outputs, contributions = table.predict(X) if table is not None else _walk(trees, X)
+    return outputs, trees.bias, contributions
+
+
+def feature_names(model, default):
+    """Names of the model's features in its own order (``default`` when it has none)."""
+    names = getattr(model, 'feature_names_in_', None)
+    return [str(name) for name in (default if names is None else names)]
+
+
+def describe(bias, contributions, feature_names, columns, decimals=6):
+    """One JSON-ready explanation per row, for output column ``columns[i]`` of row i.
+
+    Contributions are a list ordered by decreasing magnitude (JSON objects may
+    be re-sorted by key on the way out).
+    """
+    explanations = []
+    for i, column in enumerate(columns):
+        row = contributions[i, :, column]
+        order = np.argsort(-np.abs(row), kind='stable')
+        explanations.append({
+            'base_value': round(float(bias[column]), decimals),
+            'contributions': [
+                {'feature': str(feature_names[j]), 'value': round(float(row[j]), decimals)} for j in order
+            ],
+        })
+    return explanations
@@ -0,0 +1,148 @@
+"""Mean-variance analytics over the investment opportunity catalogue.
+
+The catalogue only carries display strings ("11%") and a risk label, so the
+numeric model is built from:
+- expected returns parsed from the ``expected_return`` strings
+- an annual volatility assumed per risk label
+- a correlation assumed per pair of risk labels
+
+The factorized model (Cholesky factor and the solves needed for the efficient
+frontier) is cached per catalogue content, so evaluating a what-if allocation
+is a matrix-vector product.
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Assumed annual volatility per risk label
+RISK_VOLATILITY: Dict[str, float] = {"low": 0.05, "moderate": 0.15, "high": 0.60}
+
+# Assumed correlation between assets of two risk labels (symmetric)
+RISK_CORRELATION: Dict[Tuple[str, str], float] = {
+    ("low", "low"): 0.30,
+    ("low", "moderate"): 0.10,
+    ("low", "high"): 0.05,
+    ("moderate", "moderate"): 0.60,
+    ("moderate", "high"): 0.40,
+    ("high", "high"): 0.70,
+}
+
+# A leading minus counts as a sign unless it follows a digit, as in "8-10%"
+_NUMBER = re.compile(r"(?<![\d.])-?\d+(?:\.\d+)?")
+
+
+def parse_return(text: Any) -> float:
+    """'11%' -> 0.11, '-5%' -> -0.05; ranges like '8-10%' use the midpoint.
+
+    Numbers are percentages too (11 -> 0.11), as they are once a catalogue
+    entry has been turned into its string key.
+    """
+    if isinstance(text, (int, float)):
+        return float(text) / 100.0
+    numbers = [float(n) for n in _NUMBER.findall(str(text))]
+    if not numbers:
+        raise ValueError(f"Cannot parse expected return: {text!r}")
+    return sum(numbers) / len(numbers) / 100.0
+
+
+def _correlation(a: str, b: str) -> float:
+    return RISK_CORRELATION.get((a, b), RISK_CORRELATION.get((b, a), 0.2))
+
+
+def catalogue_key(catalogue: Sequence[Dict[str, Any]]) -> Tuple[Tuple[str, str, str], ...]:
+    """Hashable fingerprint of the fields the model depends on."""
+    return tuple(
+        (str(o["title"]), str(o["expected_return"]), str(o.get("risk", "moderate")))
+        for o in catalogue
+    )
+
+
+class CatalogueModel:
+    """Numeric return / covariance model with cached factorizations."""
+
+    def __init__(self, key: Tuple[Tuple[str, str, str], ...]) -> None:
+        self.titles = [title for title, _, _ in key]
+        self.index = {title: i for i, title in enumerate(self.titles)}
+        risks = [risk for _, _, risk in key]
+        self.mu = np.array([parse_return(ret) for _, ret, _ in key])
+
+        vol = np.array([RISK_VOLATILITY.get(r, RISK_VOLATILITY["moderate"]) for r in risks])
+        corr = np.array([[1.0 if i == j else _correlation(a, b) for j, b in enumerate(risks)]
+                         for i, a in enumerate(risks)])
+        cov = corr * np.outer(vol, vol)
+
+        # Assumed correlations are not guaranteed to be positive definite
+        eigvals, eigvecs = np.linalg.eigh(cov)
+        floor = 1e-10 * max(float(eigvals.max()), 1e-12)
+        if eigvals.min() < floor:
+            cov = (eigvecs * np.maximum(eigvals, floor)) @ eigvecs.T
+        self.vol = vol
+        self.cov = cov
+        self.chol = np.linalg.cholesky(cov)
+
+        ones = np.ones(len(self.titles))
+        self.inv_ones = self._solve(ones)
+        self.inv_mu = self._solve(self.mu)
+        self.a = float(ones @ self.inv_ones)
+        self.b = float(ones @ self.inv_mu)
+        self.c = float(self.mu @ self.inv_mu)
+        self.d = self.a * self.c - self.b ** 2
+
+    def _solve(self, rhs: np.ndarray) -> np.ndarray:
+        y = np.linalg.solve(self.chol, rhs)
+        return np.linalg.solve(self.chol.T, y)
+
+    def weights(self, allocations: Dict[str, float]) -> Tuple[np.ndarray, List[str]]:
+        """Weight vector (fractions) from {title: percent}; unknown titles are returned separately."""
+        w = np.zeros(len(self.titles))
+        unknown = []
+        for title, percent in allocations.items():
+            i = self.index.get(title)
+            if i is None:
+                unknown.append(title)
+            else:
+                value = float(percent)
+                if not np.isfinite(value):
+                    raise ValueError(f"Allocation for {title!r} is not a finite number")
+                w[i] += value / 100.0
+        return w, unknown
+
+    def evaluate(self, weights: np.ndarray) -> Dict[str, np.ndarray]:
+        """Expected return and volatility for one (n,) or many (k, n) weight vectors."""
+        w = np.atleast_2d(weights)
+        ret = w @ self.mu
+        vol = np.linalg.norm(w @ self.chol, axis=1)
+        return {"expected_return": ret, "volatility": vol}
+
+    def frontier(self, points: int = 20) -> Dict[str, np.ndarray]:
+        """Closed-form minimum-variance frontier (fully invested, short sales allowed)."""
+        min_var_return = self.b / self.a
+        top = max(float(self.mu.max()), min_var_return)
+        targets = np.linspace(min_var_return, top, points)
+        if self.d <= 1e-15:
+            # All assets share one expected return: the frontier is a single point
+            w = np.tile(self.inv_ones / self.a, (points, 1))
+        else:
+            lam = (self.c - self.b * targets) / self.d
+            gam = (self.a * targets - self.b) / self.d
+            w = lam[:, None] * self.inv_ones[None, :] + gam[:, None] * self.inv_mu[None, :]
+        stats = self.evaluate(w)
+        return {"expected_return": stats["expected_return"], "volatility": stats["volatility"], "weights": w}
+
+
+@lru_cache(maxsize=8)
+def _model_for_key(key: Tuple[Tuple[str, str, str], ...]) -> CatalogueModel:
+    return CatalogueModel(key)
+
+
+def model_for(catalogue: Sequence[Dict[str, Any]]) -> CatalogueModel:
+    """Cached model for the catalogue's current contents."""
+    return _model_for_key(catalogue_key(catalogue))
+
+
+def model_cache_stats() -> Dict[str, int]:
+    """Hits, misses and size of the per-catalogue model cache."""
+    return _model_for_key.cache_info()._asdict()
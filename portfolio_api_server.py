@@ -1,20 +1,64 @@
+import contextvars
+import functools
 import os
 import pickle
+import sys
+import threading
 from typing import List, Dict, Any, Callable
 
-from fastapi import FastAPI, Body
+import numpy as np
+from fastapi import APIRouter, FastAPI, Body, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
 
+# Helpers shared with ml_api_server.py live in moneyplan_ai/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'moneyplan_ai'))
+import response_encoding  # noqa: E402
+import portfolio_analytics  # noqa: E402
+import request_profiling  # noqa: E402
+import traffic_capture  # noqa: E402
 
-app = FastAPI(title="Investment Portfolio API", version="1.0.0")
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Accept header of the request being served, read by NegotiatedResponse
+_REQUEST_ACCEPT: contextvars.ContextVar[str | None] = contextvars.ContextVar("request_accept", default=None)
+
+
+class NegotiatedResponse(JSONResponse):
+    """JSON by default; MessagePack or Arrow IPC when the request's Accept header asks for it."""
+
+    def __init__(self, content: Any, *args: Any, **kwargs: Any) -> None:
+        self._encoded = None
+        formats = response_encoding.negotiate(_REQUEST_ACCEPT.get())
+        if formats[0] != response_encoding.JSON:
+            self._encoded = response_encoding.encode(content, formats)
+            if self._encoded is not None:
+                self.media_type = self._encoded[1]
+        super().__init__(content, *args, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        if self._encoded is not None:
+            return self._encoded[0]
+        return super().render(content)
+
+
+def _error_response(message: str, status_code: int = 400, **extra: Any) -> NegotiatedResponse:
+    """The usual {"status": "error"} body, sent with an HTTP error status."""
+    return NegotiatedResponse({"status": "error", "message": message, **extra}, status_code=status_code)
+
+
+# Routes are registered on this router; create_app() builds the FastAPI app around it
+router = APIRouter(default_response_class=NegotiatedResponse)
+
+
+async def negotiate_response_format(request: Request, call_next):
+    token = _REQUEST_ACCEPT.set(request.headers.get("accept"))
+    try:
+        response = await call_next(request)
+    finally:
+        _REQUEST_ACCEPT.reset(token)
+    response.headers.append("Vary", "Accept")
+    return response
 
 
 # In-memory user profile and portfolio state
@@ -130,12 +174,12 @@ def _compute_with_calculator(payload: Dict[str, Any]) -> Dict[str, Any] | None:
         return None
 
 
-@app.get("/user/profile")
+@router.get("/user/profile")
 def get_user_profile() -> Dict[str, Any]:
     return USER_PROFILE
 
 
-@app.get("/user/retirement-profile")
+@router.get("/user/retirement-profile")
 def get_retirement_profile() -> Dict[str, Any]:
     return RETIREMENT_PROFILE
 
@@ -173,13 +217,140 @@ def _filter_opportunities_by_risk(risk_level: str) -> List[Dict[str, Any]]:
     return selected[:5]
 
 
-@app.get("/market/opportunities")
+@router.get("/market/opportunities")
 def get_market_opportunities() -> List[Dict[str, Any]]:
     risk_level = USER_PROFILE.get("risk_level", "moderate")
     return _filter_opportunities_by_risk(risk_level)
 
 
-@app.post("/portfolio/update")
+# Guards PORTFOLIO and RETIREMENT_STRATEGY: sync endpoints run on a thread pool
+_STATE_LOCK = threading.Lock()
+
+MAX_BULK_OPERATIONS = 1000
+# Slack for rounding when a bulk update must total exactly 100%
+ALLOCATION_TOLERANCE = 0.01
+
+
+def _with_state_lock(fn: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        with _STATE_LOCK:
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def _category_totals(holdings: List[Dict[str, Any]]) -> Dict[str, float]:
+    by_category: Dict[str, float] = {}
+    for p in holdings:
+        by_category[p["category"]] = by_category.get(p["category"], 0.0) + p["allocation_percent"]
+    return by_category
+
+
+def _apply_operations(
+    holdings: List[Dict[str, Any]],
+    operations: List[Dict[str, Any]],
+    item_key: str,
+    new_entry: Callable[[Dict[str, Any], float], Dict[str, Any] | None],
+) -> Dict[str, Dict[str, Any]]:
+    """Apply add / remove / set_allocation operations to a copy of ``holdings``.
+
+    Returns the resulting {title: entry} mapping. Raises ValueError naming the
+    first invalid operation; ``holdings`` itself is never modified.
+    """
+    result = {h["title"]: dict(h) for h in holdings}
+    for i, op in enumerate(operations):
+        if not isinstance(op, dict):
+            raise ValueError(f"Operation {i}: expected an object")
+        action = op.get("action")
+        item = op.get(item_key) or {}
+        if not isinstance(item, dict):
+            raise ValueError(f"Operation {i}: {item_key} must be an object")
+        title = op.get("title") or item.get("title")
+        if action not in ("add", "remove", "set_allocation"):
+            raise ValueError(f"Operation {i}: unknown action {action!r}")
+        if not title:
+            raise ValueError(f"Operation {i}: missing title")
+
+        if action == "remove":
+            if result.pop(title, None) is None:
+                raise ValueError(f"Operation {i}: {title!r} is not held")
+            continue
+
+        if action == "set_allocation" and "allocation_percent" not in op:
+            raise ValueError(f"Operation {i}: missing allocation_percent")
+        try:
+            percent = float(op.get("allocation_percent", 10.0))
+        except (TypeError, ValueError):
+            raise ValueError(f"Operation {i}: allocation_percent must be numeric")
+        if not 0.0 <= percent <= 100.0:
+            raise ValueError(f"Operation {i}: allocation_percent must be between 0 and 100")
+
+        if title in result:
+            result[title]["allocation_percent"] = percent
+        elif action == "set_allocation":
+            raise ValueError(f"Operation {i}: {title!r} is not held")
+        else:
+            entry = new_entry({**item, "title": title}, percent)
+            if entry is None:
+                raise ValueError(f"Operation {i}: invalid {item_key} payload")
+            result[title] = entry
+    return result
+
+
+def _holdings_diff(before: List[Dict[str, Any]], after: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Entries added, updated (with their previous allocation) and titles removed."""
+    old = {h["title"]: h for h in before}
+    return {
+        "added": [e for title, e in after.items() if title not in old],
+        "updated": [
+            {**e, "previous_allocation_percent": old[title]["allocation_percent"]}
+            for title, e in after.items()
+            if title in old and e != old[title]
+        ],
+        "removed": [title for title in old if title not in after],
+    }
+
+
+def _changed_totals(before: Dict[str, float], after: Dict[str, float]) -> Dict[str, float]:
+    """New totals of the categories whose total changed (0.0 when emptied)."""
+    return {
+        c: after.get(c, 0.0)
+        for c in sorted(set(before) | set(after))
+        if before.get(c) != after.get(c)
+    }
+
+
+def _bulk_update(
+    holdings: List[Dict[str, Any]],
+    operations: List[Dict[str, Any]],
+    item_key: str,
+    new_entry: Callable[[Dict[str, Any], float], Dict[str, Any] | None],
+    require_full_allocation: bool,
+) -> tuple[List[Dict[str, Any]] | None, Dict[str, Any] | NegotiatedResponse]:
+    """(new holdings, response) for a bulk update; on error, (None, a 400 response)."""
+    if len(operations) > MAX_BULK_OPERATIONS:
+        return None, _error_response(f"Too many operations (limit {MAX_BULK_OPERATIONS})")
+    try:
+        result = _apply_operations(holdings, operations, item_key, new_entry)
+    except ValueError as e:
+        return None, _error_response(str(e))
+
+    updated = list(result.values())
+    total = sum(p["allocation_percent"] for p in updated)
+    if require_full_allocation and abs(total - 100.0) > ALLOCATION_TOLERANCE:
+        return None, _error_response(f"Allocations total {total:g}%, expected 100%", total_allocation=total)
+    return updated, {
+        "status": "ok",
+        "applied": len(operations),
+        "changes": _holdings_diff(holdings, result),
+        "total_allocation": total,
+        "by_category": _changed_totals(_category_totals(holdings), _category_totals(updated)),
+        "count": len(updated),
+    }
+
+
+@router.post("/portfolio/update")
+@_with_state_lock
 def update_portfolio(
     action: str = Body("add"),
     item: Dict[str, Any] = Body(...),
@@ -224,12 +395,131 @@ def update_portfolio(
     }
 
 
+def _portfolio_entry(item: Dict[str, Any], allocation_percent: float) -> Dict[str, Any] | None:
+    if not item.get("category"):
+        return None
+    return {"title": item["title"], "category": item["category"], "allocation_percent": allocation_percent}
+
+
+@router.post("/portfolio/update/bulk")
+@_with_state_lock
+def bulk_update_portfolio(
+    operations: List[Dict[str, Any]] = Body(...),
+    require_full_allocation: bool = Body(False),
+) -> Dict[str, Any]:
+    """Apply many add / remove / set_allocation operations in one call.
+
+    Operations look like {"action": "add", "item": {...}, "allocation_percent": 20},
+    {"action": "remove", "title": ...} or {"action": "set_allocation", "title": ...,
+    "allocation_percent": 15}. Either all of them are applied or none is (also when
+    ``require_full_allocation`` is set and the result does not total 100%). Only the
+    changes are returned, with the new total and the changed category totals.
+    """
+    global PORTFOLIO
+    updated, response = _bulk_update(
+        PORTFOLIO, operations, "item", _portfolio_entry, require_full_allocation)
+    if updated is not None:
+        PORTFOLIO = updated
+    return response
+
+
+def _round_list(values: np.ndarray, decimals: int = 4) -> List[float]:
+    return np.round(values, decimals).tolist()
+
+
+@router.get("/portfolio/analytics")
+def get_portfolio_analytics(frontier_points: int = 20) -> Dict[str, Any]:
+    """Expected return, volatility and the efficient frontier for the current portfolio."""
+    model = portfolio_analytics.model_for(BASE_OPPORTUNITIES)
+    weights, unknown = model.weights({p["title"]: p["allocation_percent"] for p in PORTFOLIO})
+    stats = model.evaluate(weights)
+    frontier = model.frontier(max(2, min(frontier_points, 200)))
+    return {
+        "expected_return": round(float(stats["expected_return"][0]), 4),
+        "volatility": round(float(stats["volatility"][0]), 4),
+        "invested_fraction": round(float(weights.sum()), 4),
+        "unknown_titles": unknown,
+        "assets": {
+            "title": model.titles,
+            "expected_return": _round_list(model.mu),
+            "volatility": _round_list(model.vol),
+        },
+        "frontier": {
+            "expected_return": _round_list(frontier["expected_return"]),
+            "volatility": _round_list(frontier["volatility"]),
+            "weights": [_round_list(w) for w in frontier["weights"]],
+            "constraint": "fully invested, short sales allowed",
+        },
+    }
+
+
+@router.post("/portfolio/analytics/what-if")
+def evaluate_what_if_allocations(
+    allocations: List[Dict[str, float]] = Body(..., embed=True),
+) -> Dict[str, Any]:
+    """Expected return and volatility for many candidate {title: percent} allocations."""
+    model = portfolio_analytics.model_for(BASE_OPPORTUNITIES)
+    try:
+        rows = [model.weights(a) for a in allocations]
+    except (TypeError, ValueError):
+        return _error_response("Allocations must map titles to numeric percentages")
+    stats = model.evaluate(np.array([w for w, _ in rows]).reshape(len(rows), len(model.titles)))
+    return {
+        "status": "ok",
+        "count": len(rows),
+        "results": {
+            "expected_return": _round_list(stats["expected_return"]),
+            "volatility": _round_list(stats["volatility"]),
+            "unknown_titles": [unknown for _, unknown in rows],
+        },
+    }
+
+
+RISK_RETURNS: Dict[str, float] = {"low": 0.05, "moderate": 0.08, "high": 0.10}
+RETIREMENT_INFLATION = 0.06
+POST_RETIREMENT_YEARS = 25
+MAX_SOLVER_PROFILES = 10000
+# Ages the solver accepts, and the largest (profiles x risk levels x ages) grid it builds
+SOLVER_MIN_AGE = 18
+SOLVER_MAX_AGE = 100
+MAX_SOLVER_GRID_CELLS = 2_000_000
+
+
 def _expected_return_from_risk(risk: str) -> float:
-    mapping = {"low": 0.05, "moderate": 0.08, "high": 0.10}
-    return mapping.get(risk, 0.08)
+    return RISK_RETURNS.get(risk, 0.08)
 
 
-@app.get("/retirement/projections")
+def _retirement_projection(
+    age: Any,
+    retirement_age: Any,
+    income: Any,
+    monthly_expenses: Any,
+    current_savings: Any,
+    expected_return: Any,
+    monthly_contribution: Any = None,
+) -> Dict[str, np.ndarray]:
+    """Fallback projection model, vectorized: every argument broadcasts.
+
+    By default the monthly contribution is the income left after expenses.
+    """
+    years = np.maximum(np.asarray(retirement_age, dtype=float) - age, 0.0)
+    required = monthly_expenses * (1 + RETIREMENT_INFLATION) ** years * 12 * POST_RETIREMENT_YEARS
+    if monthly_contribution is None:
+        monthly_contribution = np.maximum(np.asarray(income, dtype=float) / 12.0 - monthly_expenses, 0.0)
+    r = np.asarray(expected_return, dtype=float)
+    growth = (1 + r) ** years
+    annuity = np.where(r > 0, (growth - 1) / np.where(r > 0, r, 1.0), years)
+    projected = current_savings * growth + monthly_contribution * 12 * annuity
+    return {
+        "years_to_retirement": years,
+        "required": required,
+        "projected": projected,
+        "growth": growth,
+        "annuity": annuity,
+    }
+
+
+@router.get("/retirement/projections")
 def get_retirement_projections() -> Dict[str, Any]:
     profile = RETIREMENT_PROFILE
     payload = {
@@ -256,35 +546,20 @@ def get_retirement_projections() -> Dict[str, Any]:
         }
 
     # Fallback formula (if no calculator or incompatible output)
-    age = payload["age"]
-    retirement_age_goal = payload["retirement_age_goal"]
-    years_to_retirement = max(retirement_age_goal - age, 0)
-    income = payload["income"]
-    monthly_expenses = payload["monthly_expenses"]
-    current_savings = payload["current_savings"]
-    risk_level = payload["risk_level"]
-
-    annual_inflation = 0.06
-    post_retirement_years = 25
-    expected_return = _expected_return_from_risk(risk_level)
-
-    adjusted_monthly_expenses = monthly_expenses * ((1 + annual_inflation) ** years_to_retirement)
-    estimated_corpus_required = adjusted_monthly_expenses * 12 * post_retirement_years
-
-    monthly_surplus = max(income / 12.0 - monthly_expenses, 0.0)
-    r = expected_return
-    n = years_to_retirement
-    fv_savings = current_savings * ((1 + r) ** n)
-    fv_contrib = 0.0
-    if r > 0 and n > 0 and monthly_surplus > 0:
-        yearly_contrib = monthly_surplus * 12
-        fv_contrib = yearly_contrib * (((1 + r) ** n - 1) / r)
-
-    projected = fv_savings + fv_contrib
+    proj = _retirement_projection(
+        payload["age"],
+        payload["retirement_age_goal"],
+        payload["income"],
+        payload["monthly_expenses"],
+        payload["current_savings"],
+        _expected_return_from_risk(payload["risk_level"]),
+    )
+    estimated_corpus_required = float(proj["required"])
+    projected = float(proj["projected"])
     shortfall_or_surplus = projected - estimated_corpus_required
 
     return {
-        "years_to_retirement": years_to_retirement,
+        "years_to_retirement": int(proj["years_to_retirement"]),
         "estimated_corpus_required": round(estimated_corpus_required, 2),
         "projected_savings_at_current_rate": round(projected, 2),
         "shortfall_or_surplus": round(shortfall_or_surplus, 2),
@@ -292,7 +567,114 @@ def get_retirement_projections() -> Dict[str, Any]:
     }
 
 
-@app.get("/retirement/recommendations")
+def _profile_arrays(profiles: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    defaults = {
+        "age": 30,
+        "retirement_age_goal": 60,
+        "income": 1200000,
+        "monthly_expenses": 40000,
+        "current_savings": 800000,
+    }
+    return {
+        key: np.array([float(p.get(key, default)) for p in profiles])
+        for key, default in defaults.items()
+    }
+
+
+def _nan_to_none(values: np.ndarray, decimals: int = 2) -> List[Any]:
+    return [None if np.isnan(v) else v for v in np.round(values, decimals).tolist()]
+
+
+@router.post("/retirement/solve")
+def solve_retirement_goal(
+    profiles: List[Dict[str, Any]] = Body(None),
+    risk_levels: List[str] = Body(None),
+    max_retirement_age: int = Body(75),
+) -> Dict[str, Any]:
+    """Required monthly SIP and earliest retirement age per profile and risk level.
+
+    Inverts the fallback projection model for many profiles at once. The
+    required SIP is closed-form (the projection is linear in the contribution);
+    retirement ages are integers, so every candidate age is evaluated as one
+    (profiles x risk levels x ages) array and the first one that closes the
+    gap is taken, which also handles plans where inflation outpaces returns.
+    """
+    profiles = profiles or [RETIREMENT_PROFILE]
+    risk_levels = risk_levels or list(RISK_RETURNS)
+    if len(profiles) * len(risk_levels) > MAX_SOLVER_PROFILES:
+        return _error_response(f"Too many profiles (limit {MAX_SOLVER_PROFILES})")
+    unknown = [r for r in risk_levels if r not in RISK_RETURNS]
+    if unknown:
+        return _error_response(f"Unknown risk levels: {unknown}")
+    if not SOLVER_MIN_AGE < max_retirement_age <= SOLVER_MAX_AGE:
+        return _error_response(
+            f"max_retirement_age must be between {SOLVER_MIN_AGE + 1} and {SOLVER_MAX_AGE}")
+    try:
+        arrays = _profile_arrays(profiles)
+    except (TypeError, ValueError):
+        return _error_response("Profile fields must be numeric")
+    if not all(np.isfinite(v).all() for v in arrays.values()):
+        return _error_response("Profile fields must be finite numbers")
+    ages, goals = arrays["age"], arrays["retirement_age_goal"]
+    if ((ages < SOLVER_MIN_AGE) | (ages >= max_retirement_age)).any():
+        return _error_response(
+            f"Profile ages must be at least {SOLVER_MIN_AGE} and below max_retirement_age")
+    if ((goals < SOLVER_MIN_AGE) | (goals > SOLVER_MAX_AGE)).any():
+        return _error_response(
+            f"retirement_age_goal must be between {SOLVER_MIN_AGE} and {SOLVER_MAX_AGE}")
+
+    # Shape (profiles, risk levels)
+    col = {k: v[:, None] for k, v in arrays.items()}
+    rates = np.array([RISK_RETURNS[r] for r in risk_levels])[None, :]
+    current_contribution = np.maximum(col["income"] / 12.0 - col["monthly_expenses"], 0.0)
+
+    at_goal = _retirement_projection(
+        col["age"], col["retirement_age_goal"], col["income"],
+        col["monthly_expenses"], col["current_savings"], rates,
+    )
+    gap = at_goal["required"] - col["current_savings"] * at_goal["growth"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        required_contribution = np.where(
+            gap <= 0, 0.0, np.where(at_goal["annuity"] > 0, gap / (12 * at_goal["annuity"]), np.nan)
+        )
+
+    # Shape (profiles, risk levels, candidate ages)
+    first_age = int(arrays["age"].min())
+    n_cells = len(profiles) * len(risk_levels) * (max_retirement_age - first_age + 1)
+    if n_cells > MAX_SOLVER_GRID_CELLS:
+        return _error_response(
+            f"Too many profile x risk level x age combinations ({n_cells}, limit {MAX_SOLVER_GRID_CELLS})")
+    ages = np.arange(first_age, max_retirement_age + 1, dtype=float)
+    grid = _retirement_projection(
+        col["age"][..., None], ages, col["income"][..., None],
+        col["monthly_expenses"][..., None], col["current_savings"][..., None], rates[..., None],
+    )
+    feasible = (grid["projected"] >= grid["required"]) & (ages >= col["age"][..., None])
+    earliest_age = np.where(feasible.any(axis=-1), ages[np.argmax(feasible, axis=-1)], np.nan)
+
+    n_profiles, n_risks = len(profiles), len(risk_levels)
+    return {
+        "status": "ok",
+        "count": n_profiles * n_risks,
+        "results": {
+            "profile": np.repeat(np.arange(n_profiles), n_risks).tolist(),
+            "risk_level": risk_levels * n_profiles,
+            "expected_return": np.broadcast_to(rates, (n_profiles, n_risks)).ravel().tolist(),
+            "estimated_corpus_required": _nan_to_none(
+                np.broadcast_to(at_goal["required"], (n_profiles, n_risks)).ravel()),
+            "current_monthly_contribution": _nan_to_none(
+                np.broadcast_to(current_contribution, (n_profiles, n_risks)).ravel()),
+            "required_monthly_contribution": _nan_to_none(required_contribution.ravel()),
+            "additional_monthly_needed": _nan_to_none(
+                np.maximum(required_contribution - current_contribution, 0.0).ravel()),
+            "earliest_retirement_age": [
+                None if np.isnan(a) else int(a) for a in earliest_age.ravel()
+            ],
+        },
+    }
+
+
+@router.get("/retirement/recommendations")
 def get_retirement_recommendations() -> List[Dict[str, Any]]:
     return [
         {
@@ -316,7 +698,8 @@ def get_retirement_recommendations() -> List[Dict[str, Any]]:
     ]
 
 
-@app.post("/retirement/strategy")
+@router.post("/retirement/strategy")
+@_with_state_lock
 def update_retirement_strategy(
     plan: Dict[str, Any] = Body(...),
     allocation_percent: float = Body(10.0),
@@ -342,6 +725,83 @@ def update_retirement_strategy(
     return {"status": "ok", "strategy": RETIREMENT_STRATEGY, "total_allocation": total}
 
 
+def _strategy_entry(plan: Dict[str, Any], allocation_percent: float) -> Dict[str, Any]:
+    return {
+        "title": plan["title"],
+        "category": plan.get("category", "Retirement"),
+        "risk": plan.get("risk", "moderate"),
+        "allocation_percent": allocation_percent,
+    }
+
+
+@router.post("/retirement/strategy/bulk")
+@_with_state_lock
+def bulk_update_retirement_strategy(
+    operations: List[Dict[str, Any]] = Body(...),
+    require_full_allocation: bool = Body(False),
+) -> Dict[str, Any]:
+    """Bulk, all-or-nothing form of /retirement/strategy (see /portfolio/update/bulk).
+
+    ``add`` operations carry the plan under "plan".
+    """
+    global RETIREMENT_STRATEGY
+    updated, response = _bulk_update(
+        RETIREMENT_STRATEGY, operations, "plan", _strategy_entry, require_full_allocation)
+    if updated is not None:
+        RETIREMENT_STRATEGY = updated
+    return response
+
+
+def create_app() -> FastAPI:
+    """Standalone app: the routes behind CORS, gzip, content negotiation and the opt-in hooks.
+
+    unified_api_server.py includes ``router`` in its own app instead.
+    """
+    app = FastAPI(
+        title="Investment Portfolio API",
+        version="1.0.0",
+        default_response_class=NegotiatedResponse,
+    )
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.add_middleware(
+        GZipMiddleware,
+        minimum_size=response_encoding.GZIP_MIN_SIZE,
+        compresslevel=response_encoding.GZIP_LEVEL,
+    )
+    app.middleware("http")(negotiate_response_format)
+    app.include_router(router)
+
+    # Opt-in request profiling (after all routes, which it wraps); no hooks unless configured
+    profiling_config = request_profiling.ProfilingConfig.from_env("portfolio_api")
+    if profiling_config.enabled:
+        request_profiling.install_fastapi(app, profiling_config)
+
+    # Opt-in traffic capture for benchmarks/replay.py (TRAFFIC_CAPTURE_PATH)
+    if traffic_capture.capture_path_from_env():
+        traffic_capture.install_fastapi(app, traffic_capture.capture_path_from_env())
+    return app
+
+
+_standalone_app: FastAPI | None = None
+
+
+def __getattr__(name: str) -> Any:
+    # ``portfolio_api_server:app`` is built on first access, so importing the
+    # module (e.g. from unified_api_server.py) installs no middleware or hooks
+    global _standalone_app
+    if name == "app":
+        if _standalone_app is None:
+            _standalone_app = create_app()
+        return _standalone_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORTFOLIO_API_PORT", "5001"))
@@ -0,0 +1,231 @@
+"""
+Single ASGI backend serving the ML API (moneyplan_ai/ml_api_server.py) and
+the portfolio API (portfolio_api_server.py) under their original paths.
+
+Portfolio and retirement routes are served natively; every other path falls
+through to the Flask app, bridged as WSGI by a2wsgi. Both halves sit behind
+one CORS / gzip / content-negotiation stack (the Flask app is built with
+``standalone=False``, so it adds none of its own), and a client can keep one
+keep-alive (or HTTP/2) connection to one port. Sync FastAPI endpoints run on
+AnyIO's worker threads, Flask views on the bridge's pool, which is sized to
+hold the ML admission queues. The pools are separate because a2wsgi (the
+replacement for Starlette's deprecated WSGI bridge) always runs WSGI apps on
+an executor of its own; as a side effect, ML requests parked in admission
+queues cannot take threads from the portfolio endpoints. Models are loaded once at start-up, the
+inference batcher is stopped at shutdown, and /metrics reports both halves.
+The standalone servers keep working unchanged.
+
+Run with:
+    uvicorn unified_api_server:app --host 0.0.0.0 --port 5000
+    hypercorn unified_api_server:app --bind 0.0.0.0:5000   # HTTP/2
+"""
+
+import contextvars
+import os
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Iterable, List
+
+import anyio.to_thread
+from a2wsgi import WSGIMiddleware
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+
+import portfolio_api_server  # also puts moneyplan_ai/ on sys.path
+import ml_api_server
+import portfolio_analytics
+import request_profiling
+import response_encoding
+import traffic_capture
+
+
+def _default_ml_threads() -> int:
+    # Flask handlers waiting in an admission queue hold a bridge thread, so the
+    # pool must fit both queues plus the other ML endpoints (rates, EMI, health).
+    queued = sum(c.max_concurrency + c.max_queue
+                 for c in (ml_api_server.loan_admission, ml_api_server.cibil_admission))
+    return queued + 10
+
+
+ML_WORKER_THREADS = int(os.environ.get("UNIFIED_ML_THREADS", "0")) or _default_ml_threads()
+
+
+# Per request: [True] until a bridge thread picks the request up
+_QUEUED: contextvars.ContextVar[List[bool]] = contextvars.ContextVar("ml_bridge_queued")
+
+
+class _CountingBridge:
+    """a2wsgi bridge to a WSGI app that counts requests waiting for and running on its threads.
+
+    a2wsgi exposes nothing but its executor, so the counts are kept at both
+    ends of the bridge: the ASGI call and the WSGI call on a pool thread
+    (a2wsgi runs the latter in a copy of the request's context).
+    """
+
+    def __init__(self, wsgi_app: Any, workers: int) -> None:
+        self.wsgi_app = wsgi_app
+        self.workers = workers
+        self.waiting = 0
+        self.busy = 0
+        self._lock = threading.Lock()
+        self._bridge = WSGIMiddleware(self._run, workers=workers)
+
+    def _picked_up(self, queued: List[bool]) -> None:
+        # Called under the lock, at most once per request
+        if queued[0]:
+            queued[0] = False
+            self.waiting -= 1
+
+    def _run(self, environ: Dict[str, Any], start_response: Any) -> Iterable[bytes]:
+        with self._lock:
+            self._picked_up(_QUEUED.get())
+            self.busy += 1
+        try:
+            yield from self.wsgi_app(environ, start_response)
+        finally:
+            with self._lock:
+                self.busy -= 1
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self._bridge(scope, receive, send)
+            return
+        queued = [True]
+        token = _QUEUED.set(queued)
+        with self._lock:
+            self.waiting += 1
+        try:
+            await self._bridge(scope, receive, send)
+        finally:
+            _QUEUED.reset(token)
+            with self._lock:
+                self._picked_up(queued)
+
+    def stats(self) -> Dict[str, int]:
+        """Pool size and the requests currently running on / waiting for it."""
+        with self._lock:
+            return {"threads": self.workers, "busy": self.busy, "waiting": self.waiting}
+
+
+class _FinalBodyChunk:
+    """Send a bridged response's last body chunk with the closing message.
+
+    a2wsgi ends every response with an empty body message, which makes
+    GZipMiddleware stream-compress even tiny bodies; merged, the minimum size
+    applies again.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        held = None
+
+        async def send_merged(message: Dict[str, Any]) -> None:
+            nonlocal held
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            if held is not None:
+                previous, held = held, None
+                if not message.get("body") and not message.get("more_body", False):
+                    await send({**previous, "more_body": False})
+                    return
+                await send(previous)
+            if message.get("more_body", False):
+                held = message
+            else:
+                await send(message)
+
+        await self.app(scope, receive, send_merged)
+        if held is not None:
+            await send({**held, "more_body": False})
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    base_ok = ml_api_server.load_model()
+    cibil_ok = ml_api_server.load_cibil_model()
+    if not (base_ok or cibil_ok):
+        print("[unified] No ML models loaded; /predict and /cibil/predict will report errors.")
+    try:
+        yield
+    finally:
+        if ml_api_server.loan_batcher is not None:
+            ml_api_server.loan_batcher.close()
+
+
+app = FastAPI(
+    title="MoneyPlan API",
+    version="1.0.0",
+    default_response_class=portfolio_api_server.NegotiatedResponse,
+    lifespan=lifespan,
+)
+
+# Same stack as portfolio_api_server.create_app(), for both halves. Flask
+# responses arrive already negotiated by its JSON provider.
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=response_encoding.GZIP_MIN_SIZE,
+    compresslevel=response_encoding.GZIP_LEVEL,
+)
+app.middleware("http")(portfolio_api_server.negotiate_response_format)
+
+app.include_router(portfolio_api_server.router)
+
+ml_app = ml_api_server.create_app(standalone=False)
+ml_bridge = _CountingBridge(ml_app, ML_WORKER_THREADS)
+
+
+@app.get("/metrics")
+async def get_metrics() -> Dict[str, Any]:
+    """ML admission / batching stats plus worker pool, model and cache state."""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    stats = limiter.statistics()
+    return {
+        **ml_api_server.metrics_snapshot(),
+        "worker_pool": {
+            "threads": int(limiter.total_tokens),
+            "busy": stats.borrowed_tokens,
+            "waiting": stats.tasks_waiting,
+        },
+        "ml_worker_pool": ml_bridge.stats(),
+        "models": {
+            "loan": ml_api_server.model is not None,
+            "cibil": ml_api_server.cibil_model is not None,
+            "retirement_calculator": portfolio_api_server.RETIREMENT_CALCULATOR_SOURCE,
+        },
+        "portfolio_model_cache": portfolio_analytics.model_cache_stats(),
+    }
+
+
+# Opt-in request profiling: Flask views are profiled by Flask hooks, FastAPI
+# endpoints by the wrappers; both write to one ring listed by /admin/profiles.
+PROFILING_CONFIG = request_profiling.ProfilingConfig.from_env("unified_api")
+if PROFILING_CONFIG.enabled:
+    request_profiling.install_flask(ml_app, PROFILING_CONFIG)
+    request_profiling.install_fastapi(app, PROFILING_CONFIG)
+
+# Opt-in traffic capture for benchmarks/replay.py (TRAFFIC_CAPTURE_PATH)
+if traffic_capture.capture_path_from_env():
+    traffic_capture.install_fastapi(app, traffic_capture.capture_path_from_env())
+
+# Registered last: everything not matched above goes to the Flask app
+app.mount("/", _FinalBodyChunk(ml_bridge))
+
+
+if __name__ == "__main__":
+    import uvicorn
+    port = int(os.environ.get("UNIFIED_API_PORT", "5000"))
+    uvicorn.run(app, host="0.0.0.0", port=port)